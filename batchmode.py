@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import time
+import requests
+
+FINISHED_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+# The Batch API rejects input files over 200 MB; stay under it with room for the multipart upload
+MAX_BYTES_PER_JOB = 190 * 1024 * 1024
+
+# Raised when the state file belongs to an unfinished batch built from different inputs
+class StaleBatchError(Exception):
+    pass
+
+# Batch API client over plain HTTP; any object with the same four methods can stand in for it
+class OpenAIBatchClient:
+    def __init__(self, api_base, api_key, timeout=300):
+        self.api_base = api_base.rstrip('/')
+        self.http = requests.Session()
+        self.http.headers['Authorization'] = f"Bearer {api_key}"
+        self.timeout = timeout
+
+    def upload(self, file_path):
+        with open(file_path, 'rb') as file:
+            response = self.http.post(f"{self.api_base}/files", data={'purpose': 'batch'},
+                                      files={'file': (os.path.basename(file_path), file)}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['id']
+
+    def submit(self, input_file_id):
+        response = self.http.post(f"{self.api_base}/batches", json={
+            'input_file_id': input_file_id,
+            'endpoint': '/v1/chat/completions',
+            'completion_window': '24h',
+        }, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['id']
+
+    def status(self, batch_id):
+        response = self.http.get(f"{self.api_base}/batches/{batch_id}", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def download(self, file_id, dest_path):
+        with self.http.get(f"{self.api_base}/files/{file_id}/content", stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            with open(dest_path + '.part', 'wb') as file:
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    file.write(chunk)
+        os.replace(dest_path + '.part', dest_path)
+
+# Write the state atomically so a restart never sees a half-written file
+def save_state(state_path, state):
+    with open(state_path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(state, file, indent=2)
+    os.replace(state_path + '.tmp', state_path)
+
+def load_state(state_path):
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+# Write the batch input JSONL, one request per bug, split into jobs under the per-file request and size limits.
+# Returns the jobs and a hash of every request written, which identifies the inputs of the batch.
+def prepare_jobs(batches, build_request, work_dir, max_requests_per_job, max_bytes_per_job=MAX_BYTES_PER_JOB, suffix=''):
+    os.makedirs(work_dir, exist_ok=True)
+    jobs = []
+    digest = hashlib.sha256()
+    file = None
+    count = 0
+    size = 0
+    for batch_number, bugs_data, urls in batches:
+        for index, (bug_data, url) in enumerate(zip(bugs_data, urls)):
+            # The custom ID carries everything needed to route the result back to its row
+            line = json.dumps({
+                'custom_id': f"{batch_number}:{index}:{url}",
+                'method': 'POST',
+                'url': '/v1/chat/completions',
+                'body': build_request(bug_data),
+            }) + '\n'
+            data = line.encode('utf-8')
+            if file is None or count == max_requests_per_job or size + len(data) > max_bytes_per_job:
+                if file:
+                    file.close()
+                input_path = os.path.join(work_dir, f"batch_input_{len(jobs) + 1}.jsonl")
+                jobs.append({'input_path': input_path})
+                file = open(input_path + suffix, 'wb')
+                count = 0
+                size = 0
+            file.write(data)
+            digest.update(data)
+            count += 1
+            size += len(data)
+    if file:
+        file.close()
+    return jobs, digest.hexdigest()
+
+# Nothing of the batch is pending at the API: it is done, or every submitted job failed, expired or was cancelled
+def _abandonable(state):
+    return state.get('finished') or all('batch_id' not in job or job.get('status') in FINISHED_STATUSES[1:]
+                                        for job in state['jobs'])
+
+# Pick the state to run: the saved one if it was built from the same inputs, a new one if the saved batch
+# is finished or missing. Refuses to abandon an unfinished batch that was built from different inputs.
+def resolve_state(state_path, batches, build_request, work_dir, max_requests_per_job, max_bytes_per_job):
+    state = load_state(state_path)
+    jobs, inputs_hash = prepare_jobs(batches, build_request, work_dir, max_requests_per_job, max_bytes_per_job,
+                                     suffix='.new')
+    if state is not None and state.get('inputs_hash') == inputs_hash:
+        for job in jobs:
+            os.remove(job['input_path'] + '.new')
+        return state
+    if state is not None and not _abandonable(state):
+        for job in jobs:
+            os.remove(job['input_path'] + '.new')
+        raise StaleBatchError(f"'{state_path}' belongs to an unfinished batch of different bugs. Re-run with the same "
+                              f"inputs to finish it, or delete the file to abandon it.")
+    if state is not None:
+        print(f"Inputs changed since the batch in '{state_path}' finished, starting a new batch")
+    for job in jobs:
+        os.replace(job['input_path'] + '.new', job['input_path'])
+    state = {'inputs_hash': inputs_hash, 'finished': False, 'jobs': jobs}
+    save_state(state_path, state)
+    return state
+
+def _error_message(result):
+    response = result.get('response') or {}
+    error = result.get('error') or (response.get('body') or {}).get('error') or response.get('status_code')
+    return error.get('message', error) if isinstance(error, dict) else error
+
+# Stream a result or error file back through extract_bug_details, grouped by scraped batch number.
+# Failed requests are reported by URL; returns how many there were.
+def read_results(output_path, extract_bug_details, results):
+    failures = 0
+    with open(output_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            result = json.loads(line)
+            batch_number, index, url = result['custom_id'].split(':', 2)
+            response = result.get('response') or {}
+            if result.get('error') or response.get('status_code') != 200:
+                print(f"Error processing {url}: {_error_message(result)}")
+                failures += 1
+                continue
+            response_text = response['body']['choices'][0]['message']['content']
+            results.setdefault(int(batch_number), []).append((int(index), extract_bug_details(response_text, url)))
+    return failures
+
+# Download one of a finished job's files once, keeping its local path in the job
+def download_once(client, job, work_dir, kind):
+    if f'{kind}_path' not in job:
+        path = os.path.join(work_dir, f"{job['batch_id']}_{kind}.jsonl")
+        client.download(job[f'{kind}_file_id'], path)
+        job[f'{kind}_path'] = path
+    return job[f'{kind}_path']
+
+# Submit the bugs as Batch API jobs, wait for them and return {batch_number: [details]} in input order.
+# Every step is recorded in the state file so a restarted process picks up where it stopped.
+def run_batch_mode(batches, build_request, extract_bug_details, client, state_path="batch_state.json",
+                   work_dir="batch_jobs", poll_interval=60, max_requests_per_job=50000,
+                   max_bytes_per_job=MAX_BYTES_PER_JOB):
+    state = resolve_state(state_path, batches, build_request, work_dir, max_requests_per_job, max_bytes_per_job)
+
+    # A job that failed, expired or was cancelled in an earlier run is submitted again
+    for job in state['jobs']:
+        if job.get('status') in FINISHED_STATUSES and job['status'] != 'completed':
+            print(f"Batch {job['batch_id']} ended as {job['status']}, resubmitting {job['input_path']}")
+            for key in ('batch_id', 'status', 'output_file_id', 'error_file_id', 'output_path', 'error_path'):
+                job.pop(key, None)
+            save_state(state_path, state)
+
+    for job in state['jobs']:
+        if 'input_file_id' not in job:
+            job['input_file_id'] = client.upload(job['input_path'])
+            save_state(state_path, state)
+        if 'batch_id' not in job:
+            job['batch_id'] = client.submit(job['input_file_id'])
+            save_state(state_path, state)
+        print(f"Submitted {job['input_path']} as {job['batch_id']}")
+
+    results = {}
+    for job in state['jobs']:
+        while job.get('status') not in FINISHED_STATUSES:
+            status = client.status(job['batch_id'])
+            job['status'] = status['status']
+            job['output_file_id'] = status.get('output_file_id')
+            job['error_file_id'] = status.get('error_file_id')
+            save_state(state_path, state)
+            if job['status'] not in FINISHED_STATUSES:
+                counts = status.get('request_counts') or {}
+                print(f"Batch {job['batch_id']} {job['status']}: {counts.get('completed', 0)}/{counts.get('total', '?')} done")
+                time.sleep(poll_interval)
+
+        if job['status'] != 'completed':
+            print(f"Batch {job['batch_id']} ended as {job['status']}; it is resubmitted on the next run")
+        failures = 0
+        for kind in ('output', 'error'):
+            if job.get(f'{kind}_file_id'):
+                failures += read_results(download_once(client, job, work_dir, kind), extract_bug_details, results)
+                save_state(state_path, state)
+        if failures:
+            print(f"{failures} requests failed inside batch {job['batch_id']}")
+        elif not job.get('output_file_id'):
+            print(f"Batch {job['batch_id']} finished as {job['status']} without results")
+
+    # Only a batch whose every job completed counts as done; anything else is retried by the next run
+    state['finished'] = all(job['status'] == 'completed' for job in state['jobs'])
+    save_state(state_path, state)
+    return {batch_number: [details for _, details in sorted(rows, key=lambda row: row[0])]
+            for batch_number, rows in sorted(results.items())}
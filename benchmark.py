@@ -0,0 +1,426 @@
+import argparse
+import asyncio
+import html
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+from extraction import SECTIONS
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+STAGES = ['gnu-http', 'bugzilla-bulk', 'bugzilla-browser', 'gnu-browser', 'summarize', 'export']
+DEFAULT_STAGES = ['gnu-http', 'bugzilla-bulk', 'summarize', 'export']
+
+# Metrics compared against the baseline, and whether a higher value is better
+BASELINE_METRICS = {'throughput': True, 'p95': False, 'peak_rss_mb': False}
+# What peak_rss_mb covers: the stage process and its children, or only the Python process (without psutil)
+RSS_TREE = 'process tree'
+RSS_PYTHON = 'python process'
+
+_WORDS = ("kernel signal race thread mutex buffer overflow crash segfault pipe socket fork exec wait timer "
+          "interrupt handler deadlock lock unlock read write open close mmap futex poll select errno").split()
+
+# Deterministic filler text of about `size` bytes
+def synthetic_text(size, seed):
+    rng = random.Random(seed)
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+def bugzilla_page(bug_id, comment):
+    return (f"<html><head><title>Bug {bug_id}</title></head><body>"
+            f"<div class=\"bz_short_desc_container edit_form\"><span>Bug {bug_id} - synthetic {bug_id}</span></div>"
+            f"<table><tr><td id=\"bz_show_bug_column_1\">Status: NEW<br>Product: Bench<br>Component: Core</td></tr></table>"
+            f"<pre class=\"bz_comment_text\">{html.escape(comment)}</pre></body></html>")
+
+def bugzilla_xml(bug_ids, comment_size):
+    bugs = "".join(
+        f"<bug><bug_id>{bug_id}</bug_id><short_desc>synthetic {bug_id}</short_desc><bug_status>NEW</bug_status>"
+        f"<product>Bench</product><component>Core</component>"
+        f"<long_desc><thetext>{escape(synthetic_text(comment_size, bug_id))}</thetext></long_desc></bug>"
+        for bug_id in bug_ids)
+    return f"<?xml version=\"1.0\"?><bugzilla>{bugs}</bugzilla>"
+
+def debbugs_page(bug_id, message):
+    return (f"<html><body><h1>Debian Bug report logs - <a href=\"#\">#{bug_id}</a><br>bench: synthetic {bug_id}</h1>"
+            f"<div class=\"pkginfo\"><p>Package: <a href=\"#\">bench</a>;</p><p>Reported by: Bench</p></div>"
+            f"<div class=\"buginfo\"><p>Date: Mon, 1 Jan 2024</p><p>Severity: normal</p></div>"
+            f"<pre class=\"headers\">From: bench@example.org\nSubject: synthetic {bug_id}</pre>"
+            f"<pre class=\"message\">{html.escape(message)}</pre></body></html>")
+
+# Synthetic Bugzilla show_bug/XML/REST pages and debbugs bug pages, with a fixed delay per request
+class FakeTrackerHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    page_size = 4096
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        if parsed.path.endswith('/show_bug.cgi') and query.get('ctype') == ['xml']:
+            body, content_type = bugzilla_xml([int(bug_id) for bug_id in query['id']], self.page_size), 'text/xml'
+        elif parsed.path.endswith('/show_bug.cgi'):
+            bug_id = int(query['id'][0])
+            body, content_type = bugzilla_page(bug_id, synthetic_text(self.page_size, bug_id)), 'text/html'
+        elif parsed.path.endswith('/rest/bug'):
+            bugs = [{'id': int(bug_id), 'summary': f"synthetic {bug_id}", 'status': 'NEW', 'product': 'Bench',
+                     'component': 'Core'} for bug_id in query['id'][0].split(',')]
+            body, content_type = json.dumps({'bugs': bugs}), 'application/json'
+        elif parsed.path.endswith('/comment'):
+            bug_ids = [parsed.path.split('/')[-2]] + query.get('ids', [])
+            comments = {bug_id: {'comments': [{'text': synthetic_text(self.page_size, int(bug_id))}]} for bug_id in bug_ids}
+            body, content_type = json.dumps({'bugs': comments}), 'application/json'
+        elif parsed.path.endswith('/bugreport.cgi'):
+            bug_id = int(query['bug'][0])
+            body, content_type = debbugs_page(bug_id, synthetic_text(self.page_size, bug_id)), 'text/html'
+        else:
+            self.send_error(404)
+            return
+        self.reply(200, body, content_type)
+
+    def reply(self, status, body, content_type):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+# Chat-completions endpoint answering in the summarizers' JSON format, with a delay and a share of 429s
+class FakeLLMHandler(FakeTrackerHandler):
+    rate_limit_share = 0.0
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(self.latency)
+        if random.random() < self.rate_limit_share:
+            self.reply(429, json.dumps({'error': {'message': "Rate limit reached", 'type': 'rate_limit_exceeded'}}),
+                       'application/json')
+            return
+        prompt = request['messages'][-1]['content']
+        content = json.dumps({section: f"synthetic {section.lower()}" for section in SECTIONS})
+        body = {
+            'id': 'chatcmpl-bench', 'object': 'chat.completion', 'model': request.get('model'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(content) // 4,
+                      'total_tokens': (len(prompt) + len(content)) // 4},
+        }
+        self.reply(200, json.dumps(body), 'application/json')
+
+# Serve a handler with its settings on a free local port, from a daemon thread
+def start_server(handler_class, **settings):
+    handler = type(handler_class.__name__, (handler_class,), settings)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))], 6)
+
+def summarize_latencies(items, elapsed, latencies, **extra):
+    return {
+        'items': items, 'seconds': round(elapsed, 3), 'throughput': round(items / elapsed, 2) if elapsed else None,
+        'p50': percentile(latencies, 50), 'p95': percentile(latencies, 95), 'p99': percentile(latencies, 99), **extra,
+    }
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def bench_gnu_http(args):
+    from gnuscraper import fetch_gnu_record, make_http_session
+    http = make_http_session(args.workers)
+    urls = [f"{args.tracker_url}/cgi-bin/bugreport.cgi?bug={bug_id}" for bug_id in range(1, args.bugs + 1)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        latencies = [latency for _, latency in executor.map(lambda url: timed(fetch_gnu_record, http, url), urls)]
+    return summarize_latencies(len(urls), time.perf_counter() - start, latencies)
+
+def bench_bugzilla_bulk(args):
+    from bugzillascraper import BULK_FETCHERS, chunks
+    from gnuscraper import make_http_session
+    http = make_http_session(args.workers)
+    bug_ids = [str(bug_id) for bug_id in range(1, args.bugs + 1)]
+    start = time.perf_counter()
+    latencies = []
+    for chunk in chunks(bug_ids, args.chunk_size):
+        records, latency = timed(BULK_FETCHERS[args.api], http, args.tracker_url + '/', chunk)
+        latencies.append(latency)
+    return summarize_latencies(len(bug_ids), time.perf_counter() - start, latencies, unit='chunk')
+
+# Render pages in a pool of browser pages, the way the async scraper does
+async def bench_browser(args, tracker):
+    from playwright.async_api import async_playwright
+    from bugzillascraper import PagePool
+    from trackers import DebbugsAdapter
+    if tracker == 'bugzilla':
+        urls = [f"{args.tracker_url}/show_bug.cgi?id={bug_id}" for bug_id in range(1, args.bugs + 1)]
+    else:
+        urls = [f"{args.tracker_url}/cgi-bin/bugreport.cgi?bug={bug_id}" for bug_id in range(1, args.bugs + 1)]
+    latencies = []
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        pool = PagePool(browser, args.workers, args.workers)
+        await pool.open()
+
+        async def scrape(url):
+            start = time.perf_counter()
+            if tracker == 'bugzilla':
+                result = await pool.scrape(url)
+            else:
+                result = await pool.run(url, lambda page: DebbugsAdapter().render(page, url))
+            if result:
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(scrape(url) for url in urls))
+        elapsed = time.perf_counter() - start
+        await pool.close()
+        await browser.close()
+    return summarize_latencies(len(latencies), elapsed, latencies, failed=len(urls) - len(latencies))
+
+async def bench_summarize(args):
+    import openai
+    from bugzillasummarizer import build_request, extract_bug_details
+    from llmscheduler import LLMScheduler
+    openai.api_base = args.llm_url + '/v1'
+    openai.api_key = 'bench'
+    scheduler = LLMScheduler(concurrency=args.concurrency, rpm=args.rpm, tpm=args.tpm, base_delay=args.base_delay)
+    bugs = [f"LINK: {args.tracker_url}/show_bug.cgi?id={bug_id}\nShort Description:\nsynthetic {bug_id}\n"
+            f"Bug Column:\nStatus: NEW\nComments:\n{synthetic_text(args.page_size, bug_id)}" for bug_id in range(1, args.bugs + 1)]
+    latencies = []
+
+    async def summarize(bug_data):
+        start = time.perf_counter()
+        try:
+            response = await scheduler.complete(**build_request(bug_data))
+        except openai.error.OpenAIError:
+            return
+        extract_bug_details(response['choices'][0]['message']['content'], None)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(summarize(bug_data) for bug_data in bugs))
+    return summarize_latencies(len(latencies), time.perf_counter() - start, latencies,
+                               retries=scheduler.stats['retries'], failed=scheduler.stats['failures'])
+
+def bench_export(args):
+    from export import RowWriter
+    rows = ({"URL": f"{args.tracker_url}/show_bug.cgi?id={bug_id}",
+             **{section: synthetic_text(args.page_size // len(SECTIONS), bug_id) for section in SECTIONS}}
+            for bug_id in range(1, args.bugs + 1))
+    latencies = []
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        with RowWriter(os.path.join(directory, 'bench'), args.export) as writer:
+            for row in rows:
+                _, latency = timed(writer.write, row)
+                latencies.append(latency)
+        elapsed = time.perf_counter() - start
+    return summarize_latencies(len(latencies), elapsed, latencies, unit='row')
+
+# Peak RSS of this process and all of its children (Chromium included), sampled from a background thread
+class TreeRssSampler:
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def sample(self):
+        total = 0
+        for process in [self.process] + self.process.children(recursive=True):
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass  # Exited between listing and sampling
+        self.peak = max(self.peak, total)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stopped.set()
+        self.thread.join()
+
+def stage_result(args):
+    if args.stage == 'gnu-http':
+        result = bench_gnu_http(args)
+    elif args.stage == 'bugzilla-bulk':
+        result = bench_bugzilla_bulk(args)
+    elif args.stage == 'bugzilla-browser':
+        result = asyncio.run(bench_browser(args, 'bugzilla'))
+    elif args.stage == 'gnu-browser':
+        result = asyncio.run(bench_browser(args, 'gnu'))
+    elif args.stage == 'summarize':
+        result = asyncio.run(bench_summarize(args))
+    else:
+        result = bench_export(args)
+    return result
+
+# Peak RSS of the whole process tree with psutil, or of the Python process alone without it
+def run_stage(args):
+    sampler = None
+    if psutil is not None:
+        with TreeRssSampler() as sampler:
+            result = stage_result(args)
+    else:
+        result = stage_result(args)
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    if sampler is not None:
+        # Sampling can miss a short spike, so never report less than the Python process's own peak
+        peak = max(peak, sampler.peak)
+    result['peak_rss_mb'] = round(peak / (1024 * 1024), 1)
+    result['rss_scope'] = RSS_TREE if sampler is not None else RSS_PYTHON
+    return result
+
+# Each stage runs in its own process so peak RSS belongs to that stage alone
+def run_stage_process(stage, args, tracker_url, llm_url):
+    command = [sys.executable, os.path.abspath(__file__), '--stage', stage, '--tracker-url', tracker_url,
+               '--llm-url', llm_url, '--bugs', str(args.bugs), '--page-size', str(args.page_size),
+               '--workers', str(args.workers), '--chunk-size', str(args.chunk_size), '--api', args.api,
+               '--concurrency', str(args.concurrency), '--rpm', str(args.rpm), '--tpm', str(args.tpm),
+               '--base-delay', str(args.base_delay), '--export', ','.join(args.export)]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        errors = [line for line in completed.stderr.splitlines() if 'Error' in line]
+        return {'error': (errors or completed.stderr.strip().splitlines() or ["failed"])[-1][:200]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def format_seconds(value):
+    return "-" if value is None else f"{value * 1000:.1f}ms"
+
+def print_report(results):
+    print(f"{'stage':<18}{'items':>7}{'seconds':>9}{'items/s':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'RSS MB':>9}")
+    for stage, result in results.items():
+        if 'error' in result:
+            print(f"{stage:<18} skipped: {result['error']}")
+            continue
+        print(f"{stage:<18}{result['items']:>7}{result['seconds']:>9.2f}{result['throughput'] or 0:>10.1f}"
+              f"{format_seconds(result['p50']):>10}{format_seconds(result['p95']):>10}{format_seconds(result['p99']):>10}"
+              f"{result['peak_rss_mb']:>9.1f}")
+    scopes = sorted({result['rss_scope'] for result in results.values() if 'rss_scope' in result})
+    if scopes:
+        print(f"RSS MB is the peak of the {' / '.join(scopes)}"
+              + ("" if psutil is not None else "; install psutil to include Chromium and other child processes"))
+
+# Stages whose throughput fell, or whose p95 latency or peak RSS grew, by more than the tolerance
+def compare_baseline(results, baseline, tolerance):
+    regressions = []
+    for stage, result in results.items():
+        before = baseline.get('results', {}).get(stage)
+        if not before or 'error' in result or 'error' in before:
+            continue
+        for metric, higher_is_better in BASELINE_METRICS.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            # Process-tree and Python-only RSS figures are not comparable
+            if metric == 'peak_rss_mb' and before.get('rss_scope', RSS_PYTHON) != result.get('rss_scope'):
+                continue
+            change = (new - old) / old
+            if (change < -tolerance) if higher_is_better else (change > tolerance):
+                regressions.append(f"{stage} {metric}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers and summarizers against a local fake tracker and LLM")
+    parser.add_argument('--stages', default=",".join(DEFAULT_STAGES), help=f"Comma-separated stages from: {', '.join(STAGES)}")
+    parser.add_argument('--bugs', type=int, default=200, help="Bugs per stage")
+    parser.add_argument('--page-size', type=int, default=4096, help="Bytes of comment text per synthetic bug")
+    parser.add_argument('--tracker-latency', type=float, default=50, help="Fake tracker delay per request, in ms")
+    parser.add_argument('--llm-latency', type=float, default=200, help="Fake LLM delay per request, in ms")
+    parser.add_argument('--llm-429-rate', type=float, default=0.05, help="Share of LLM requests answered with 429")
+    parser.add_argument('--workers', type=int, default=8, help="HTTP workers or browser pages")
+    parser.add_argument('--chunk-size', type=int, default=100, help="Bugs per bulk request")
+    parser.add_argument('--api', choices=['xml', 'rest'], default='xml', help="Bulk API for the bugzilla-bulk stage")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent LLM requests")
+    parser.add_argument('--rpm', type=int, default=100000)
+    parser.add_argument('--tpm', type=int, default=100000000)
+    parser.add_argument('--base-delay', type=float, default=1.0, help="Backoff base delay after a 429, in seconds")
+    parser.add_argument('--export', default='xlsx', help="Formats written by the export stage")
+    parser.add_argument('--save-baseline', help="Write the results to this JSON file")
+    parser.add_argument('--baseline', help="Compare against this baseline and exit 1 on a regression")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed relative change before a regression is flagged")
+    parser.add_argument('--stage', help=argparse.SUPPRESS)
+    parser.add_argument('--tracker-url', help=argparse.SUPPRESS)
+    parser.add_argument('--llm-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.export = args.export.split(',')
+
+    if args.stage:
+        # Child process: run one stage against servers started by the parent
+        print(json.dumps(run_stage(args)))
+        return
+
+    stages = [stage.strip() for stage in args.stages.split(',') if stage.strip()]
+    for stage in stages:
+        if stage not in STAGES:
+            parser.error(f"Unknown stage {stage!r}")
+
+    tracker, tracker_url = start_server(FakeTrackerHandler, latency=args.tracker_latency / 1000, page_size=args.page_size)
+    llm, llm_url = start_server(FakeLLMHandler, latency=args.llm_latency / 1000, rate_limit_share=args.llm_429_rate)
+    results = {}
+    try:
+        for stage in stages:
+            print(f"Running {stage}...")
+            results[stage] = run_stage_process(stage, args, tracker_url, llm_url)
+    finally:
+        tracker.shutdown()
+        llm.shutdown()
+
+    print_report(results)
+    settings = {name: getattr(args, name) for name in ('bugs', 'page_size', 'tracker_latency', 'llm_latency',
+                                                       'llm_429_rate', 'workers', 'chunk_size', 'api', 'concurrency')}
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as file:
+            json.dump({'settings': settings, 'results': results}, file, indent=2)
+        print(f"Saved baseline to '{args.save_baseline}'")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        if baseline.get('settings') != settings:
+            print("Warning: baseline was recorded with different settings")
+        regressions = compare_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import csv
+import statistics
+import time
+from urllib.parse import urlparse
+from metrics import metrics
+
+# Resource types the scrapers never need to extract text
+BLOCKED_RESOURCE_TYPES = {'image', 'stylesheet', 'font', 'media'}
+
+# Analytics and tracking hosts, matched as host suffixes
+BLOCKED_HOSTS = (
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+    'hotjar.com', 'matomo.cloud', 'piwik.pro', 'newrelic.com', 'nr-data.net', 'sentry.io',
+)
+
+# How to wait for each tracker: the load state to stop at, and the selectors that must be in the DOM
+WAIT_STRATEGIES = {
+    'bugzilla': {
+        'wait_until': 'domcontentloaded',
+        'selectors': ['div.bz_short_desc_container.edit_form', 'td#bz_show_bug_column_1', 'pre.bz_comment_text'],
+        'timeout': 10000,
+    },
+    'gnu': {
+        'wait_until': 'domcontentloaded',
+        'selectors': ['h1'],
+        'timeout': 10000,
+    },
+}
+
+# One browser round-trip that resolves as soon as every selector is attached
+_ALL_SELECTORS_PRESENT = "selectors => selectors.every(selector => document.querySelector(selector))"
+
+def should_block(request, blocked_types=BLOCKED_RESOURCE_TYPES, blocked_hosts=BLOCKED_HOSTS):
+    if request.resource_type in blocked_types:
+        return True
+    host = urlparse(request.url).hostname or ''
+    return any(host == blocked or host.endswith('.' + blocked) for blocked in blocked_hosts)
+
+# Abort blocked requests on a sync Playwright page
+def block_resources(page, stats=None):
+    def handle(route):
+        if should_block(route.request):
+            if stats is not None:
+                stats.blocked(page)
+            route.abort()
+        else:
+            route.continue_()
+    page.route("**/*", handle)
+
+# Abort blocked requests on an async Playwright page
+async def block_resources_async(page, stats=None):
+    async def handle(route):
+        if should_block(route.request):
+            if stats is not None:
+                stats.blocked(page)
+            await route.abort()
+        else:
+            await route.continue_()
+    await page.route("**/*", handle)
+
+# Set up a new page with resource blocking and stats collection
+def prepare_page(page, stats=None, block=True):
+    if block:
+        block_resources(page, stats)
+    if stats is not None:
+        stats.watch(page)
+    return page
+
+async def prepare_page_async(page, stats=None, block=True):
+    if block:
+        await block_resources_async(page, stats)
+    if stats is not None:
+        stats.watch_async(page)
+    return page
+
+def goto_and_wait(page, url, strategy):
+    with metrics.span('goto', url):
+        page.goto(url, wait_until=strategy['wait_until'], timeout=strategy['timeout'] * 3)
+    with metrics.span('wait_selectors', url):
+        page.wait_for_function(_ALL_SELECTORS_PRESENT, arg=strategy['selectors'], timeout=strategy['timeout'])
+
+async def goto_and_wait_async(page, url, strategy):
+    with metrics.span('goto', url):
+        await page.goto(url, wait_until=strategy['wait_until'], timeout=strategy['timeout'] * 3)
+    with metrics.span('wait_selectors', url):
+        await page.wait_for_function(_ALL_SELECTORS_PRESENT, arg=strategy['selectors'], timeout=strategy['timeout'])
+
+# Per-page latency, bytes transferred and blocked requests
+class PageStats:
+    def __init__(self):
+        self.rows = []
+        self.current = {}
+
+    # Count bytes of every finished request on the page against the URL it is loading
+    def watch(self, page):
+        def on_finished(request):
+            row = self.current.get(page)
+            if row is not None:
+                sizes = request.sizes()
+                row['bytes'] += sizes['responseBodySize'] + sizes['responseHeadersSize']
+                row['requests'] += 1
+        page.on('requestfinished', on_finished)
+
+    def watch_async(self, page):
+        async def on_finished(request):
+            row = self.current.get(page)
+            if row is not None:
+                sizes = await request.sizes()
+                row['bytes'] += sizes['responseBodySize'] + sizes['responseHeadersSize']
+                row['requests'] += 1
+        page.on('requestfinished', on_finished)
+
+    def begin(self, page, url):
+        self.current[page] = {'url': url, 'backend': 'browser', 'start': time.perf_counter(),
+                              'bytes': 0, 'requests': 0, 'blocked': 0}
+
+    def end(self, page):
+        row = self.current.pop(page, None)
+        if row is not None:
+            row['latency'] = time.perf_counter() - row.pop('start')
+            self.rows.append(row)
+
+    def blocked(self, page):
+        row = self.current.get(page)
+        if row is not None:
+            row['blocked'] += 1
+
+    # Record a page fetched without a browser
+    def add(self, url, latency, size, backend='http'):
+        self.rows.append({'url': url, 'backend': backend, 'bytes': size, 'requests': 1, 'blocked': 0, 'latency': latency})
+
+    def report(self):
+        if not self.rows:
+            return "No pages measured"
+        latencies = sorted(row['latency'] for row in self.rows)
+        total_bytes = sum(row['bytes'] for row in self.rows)
+        return (f"Pages: {len(self.rows)}, latency p50: {statistics.median(latencies):.2f}s, "
+                f"p95: {latencies[int(0.95 * (len(latencies) - 1))]:.2f}s, "
+                f"bytes: {total_bytes / 1024:.0f} KiB ({total_bytes / len(self.rows) / 1024:.1f} KiB/page), "
+                f"blocked requests: {sum(row['blocked'] for row in self.rows)}")
+
+    def save_csv(self, file_path):
+        with open(file_path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=['url', 'backend', 'latency', 'bytes', 'requests', 'blocked'])
+            writer.writeheader()
+            writer.writerows(self.rows)
+
+# Command-line options shared by both scrapers
+def add_browser_arguments(parser):
+    parser.add_argument('--no-block', action='store_true', help="Load images, CSS, fonts, media and analytics")
+    parser.add_argument('--page-stats', help="Write per-page latency and bytes to this CSV file")
@@ -1,74 +1,393 @@
 from playwright.sync_api import sync_playwright
+from playwright.async_api import async_playwright
+from urllib.parse import urlparse, parse_qs
+import xml.etree.ElementTree as ET
+import argparse
+import asyncio
+import requests
 import pandas as pd
 import time
 from tqdm import tqdm
 import logging
+from recordstore import RecordStore
+from browserutil import (WAIT_STRATEGIES, PageStats, add_browser_arguments, goto_and_wait, goto_and_wait_async,
+                         prepare_page, prepare_page_async)
+from ledger import ProgressLedger, add_ledger_arguments, next_batch_number
+from sharding import add_shard_argument, select_shard
+from metrics import add_metrics_arguments, finish_metrics, metrics, start_metrics
 
-# Setup logging
-logging.basicConfig(filename='scraping_errors.log', level=logging.ERROR)
+# Last error per link, kept until the batch is saved so the progress ledger can record the reason
+scrape_errors = {}
 
 # Parse Excel file to get bug links
-df = pd.read_excel('bugsmini.xlsx', sheet_name='Sheet1')
-bug_links = df['LINK'].tolist()
+def read_bug_links(file_path='bugsmini.xlsx'):
+    df = pd.read_excel(file_path, sheet_name='Sheet1')
+    return df['LINK'].tolist()
 
 # Function to scrape data from a URL using Playwright
-def scrape_data(page, url):
+def scrape_data(page, url, stats=None):
+    if stats is not None:
+        stats.begin(page, url)
     try:
-        page.goto(url)
-        page.wait_for_selector('div.bz_short_desc_container.edit_form', timeout=10000)
-        page.wait_for_selector('td#bz_show_bug_column_1', timeout=10000)
-        page.wait_for_selector('pre.bz_comment_text', timeout=10000)
-        short_desc = page.inner_text('div.bz_short_desc_container.edit_form')
-        bug_column = page.inner_text('td#bz_show_bug_column_1')
-        comments = page.inner_text('pre.bz_comment_text')
+        goto_and_wait(page, url, WAIT_STRATEGIES['bugzilla'])
+        with metrics.span('extract', url):
+            short_desc = page.inner_text('div.bz_short_desc_container.edit_form')
+            bug_column = page.inner_text('td#bz_show_bug_column_1')
+            comments = page.inner_text('pre.bz_comment_text')
         return {'short_desc': short_desc, 'bug_column': bug_column, 'comments': comments}
     except Exception as e:
+        metrics.count('scrape_failures')
         logging.error(f"Error scraping {url}: {e}")
+        scrape_errors[url] = str(e)
         return None
+    finally:
+        if stats is not None:
+            stats.end(page)
+
+# Async version of scrape_data for the concurrent engine
+async def scrape_data_async(page, url, stats=None):
+    if stats is not None:
+        stats.begin(page, url)
+    try:
+        await goto_and_wait_async(page, url, WAIT_STRATEGIES['bugzilla'])
+        with metrics.span('extract', url):
+            short_desc = await page.inner_text('div.bz_short_desc_container.edit_form')
+            bug_column = await page.inner_text('td#bz_show_bug_column_1')
+            comments = await page.inner_text('pre.bz_comment_text')
+        return {'short_desc': short_desc, 'bug_column': bug_column, 'comments': comments}
+    except Exception as e:
+        metrics.count('scrape_failures')
+        logging.error(f"Error scraping {url}: {e}")
+        scrape_errors[url] = str(e)
+        return None
+    finally:
+        if stats is not None:
+            stats.end(page)
 
 # Break the bug links into batches of 50
 def chunks(lst, n):
     for i in range(0, len(lst), n):
         yield lst[i:i + n]
 
-# Start Playwright and use headless browser
-with sync_playwright() as p:
-    browser = p.chromium.launch(headless=True)
-    page = browser.new_page()
+# Format one scraped bug the way it is stored in the batch files
+def format_bug_record(link, content):
+    return (f"LINK: {link}\n"
+            f"Short Description:\n{content['short_desc']}\n"
+            f"Bug Column:\n{content['bug_column']}\n"
+            f"Comments:\n{content['comments']}\n")
+
+# Save the scraped data for a batch in a .txt file, and in the record store if one is given.
+# Links are only marked done in the ledger once their batch file is written.
+def save_batch(file_path, scraped_data, store=None, ledger=None):
+    with open(file_path, 'w', encoding='utf-8') as file:
+        for link, content in scraped_data.items():
+            if content:
+                file.write(format_bug_record(link, content))
+                file.write("-" * 80 + "\n")
+                if store is not None:
+                    store.add('bugzilla', link, content)
+    if store is not None:
+        store.flush()
+    if ledger is not None:
+        ledger.mark_done([link for link, content in scraped_data.items() if content])
+        for link, content in scraped_data.items():
+            if not content:
+                ledger.mark_failed(link, scrape_errors.pop(link, "No data scraped"))
+
+# Bug column fields as (label, show_bug.cgi?ctype=xml field, REST field)
+BUG_COLUMN_FIELDS = [
+    ('Status', 'bug_status', 'status'),
+    ('Resolution', 'resolution', 'resolution'),
+    ('Product', 'product', 'product'),
+    ('Component', 'component', 'component'),
+    ('Version', 'version', 'version'),
+    ('Hardware', 'rep_platform', 'platform'),
+    ('OS', 'op_sys', 'op_sys'),
+    ('Priority', 'priority', 'priority'),
+    ('Severity', 'bug_severity', 'severity'),
+    ('Target Milestone', 'target_milestone', 'target_milestone'),
+    ('Assignee', 'assigned_to', 'assigned_to'),
+    ('QA Contact', 'qa_contact', 'qa_contact'),
+    ('URL', 'bug_file_loc', 'url'),
+    ('Keywords', 'keywords', 'keywords'),
+    ('Depends on', 'dependson', 'depends_on'),
+    ('Blocks', 'blocked', 'blocks'),
+]
+
+# Split a show_bug link into the Bugzilla base URL and the bug ID
+def parse_bug_link(link):
+    parsed = urlparse(str(link))
+    ids = parse_qs(parsed.query).get('id')
+    if not ids or not ids[0].isdigit():
+        return None
+    base_url = f"{parsed.scheme}://{parsed.netloc}{parsed.path.rsplit('/', 1)[0]}/"
+    return base_url, ids[0]
+
+# Build the same record scrape_data returns from bulk API fields
+def make_bug_record(bug_id, summary, fields, first_comment):
+    bug_column = "\n".join(f"{label}: {fields.get(label) or '---'}" for label, _, _ in BUG_COLUMN_FIELDS)
+    return {'short_desc': f"Bug {bug_id} - {summary}", 'bug_column': bug_column, 'comments': first_comment}
+
+# Fetch many bugs in one request through show_bug.cgi?ctype=xml
+def fetch_bugs_xml(http, base_url, bug_ids, timeout=60):
+    params = [('ctype', 'xml'), ('excludefield', 'attachmentdata')] + [('id', bug_id) for bug_id in bug_ids]
+    response = http.get(base_url + 'show_bug.cgi', params=params, timeout=timeout)
+    response.raise_for_status()
+
+    records = {}
+    for bug in ET.fromstring(response.content).iter('bug'):
+        if bug.get('error'):
+            continue
+        bug_id = bug.findtext('bug_id')
+        fields = {}
+        for label, xml_field, _ in BUG_COLUMN_FIELDS:
+            values = [element.text for element in bug.findall(xml_field) if element.text]
+            fields[label] = ", ".join(values)
+        first_comment = bug.find('long_desc')
+        comment_text = first_comment.findtext('thetext', '') if first_comment is not None else ''
+        records[bug_id] = make_bug_record(bug_id, bug.findtext('short_desc', ''), fields, comment_text)
+    return records
+
+# Fetch many bugs through the REST API, one request for fields and one for comments
+def fetch_bugs_rest(http, base_url, bug_ids, timeout=60):
+    response = http.get(base_url + 'rest/bug', params={'id': ",".join(bug_ids)}, timeout=timeout)
+    response.raise_for_status()
+    bugs = response.json().get('bugs', [])
+
+    # The comment endpoint takes extra bug IDs through the ids parameter
+    response = http.get(f"{base_url}rest/bug/{bug_ids[0]}/comment", params={'ids': bug_ids[1:]}, timeout=timeout)
+    response.raise_for_status()
+    comments = response.json().get('bugs', {})
+
+    records = {}
+    for bug in bugs:
+        bug_id = str(bug['id'])
+        fields = {}
+        for label, _, rest_field in BUG_COLUMN_FIELDS:
+            value = bug.get(rest_field)
+            fields[label] = ", ".join(str(v) for v in value) if isinstance(value, list) else (value or '')
+        bug_comments = comments.get(bug_id, {}).get('comments', [])
+        comment_text = bug_comments[0].get('text', '') if bug_comments else ''
+        records[bug_id] = make_bug_record(bug_id, bug.get('summary', ''), fields, comment_text)
+    return records
+
+BULK_FETCHERS = {'xml': fetch_bugs_xml, 'rest': fetch_bugs_rest}
+
+# Fetch bug links in chunks through a bulk endpoint, returning the records and the links left for the browser
+def scrape_bulk(bug_links, chunk_size=100, api='xml', http=None):
+    if http is None:
+        http = requests.Session()
+    fetch_bugs = BULK_FETCHERS[api]
+
+    # Group the bug IDs by Bugzilla instance
+    by_base = {}
+    fallback = []
+    for link in bug_links:
+        parsed = parse_bug_link(link)
+        if parsed is None:
+            fallback.append(link)
+        else:
+            by_base.setdefault(parsed[0], []).append((link, parsed[1]))
+
+    scraped_data = {}
+    for base_url, entries in by_base.items():
+        for chunk in tqdm(list(chunks(entries, chunk_size)), desc=f"Bulk fetching {urlparse(base_url).netloc}", unit="chunk"):
+            try:
+                with metrics.span('bulk_fetch', base_url, bugs=len(chunk)):
+                    records = fetch_bugs(http, base_url, [bug_id for _, bug_id in chunk])
+            except Exception as e:
+                logging.error(f"Error bulk fetching {base_url}: {e}")
+                records = {}
+            for link, bug_id in chunk:
+                if bug_id in records:
+                    scraped_data[link] = records[bug_id]
+                else:
+                    fallback.append(link)
+    return scraped_data, fallback
+
+# Bulk fetch through the Bugzilla API, rendering only the bugs it could not return.
+# Links are handled a window of whole batches at a time, at least one bulk chunk long, and each batch file is
+# written (and its links marked in the ledger) as soon as its window is resolved, so --resume works mid-run.
+def run_bulk(bug_links, batch_size=50, chunk_size=100, api='xml', delay=2, store=None, ledger=None, first_batch=1,
+             stats=None, block=True):
+    http = requests.Session()
+    window_size = batch_size * -(-chunk_size // batch_size)
+    playwright = browser = page = None
+    batch_number = first_batch
+    try:
+        for window in chunks(bug_links, window_size):
+            scraped_data, fallback = scrape_bulk(window, chunk_size, api, http)
+
+            # Launch the browser the first time a link needs rendering and keep it for later windows
+            if fallback and page is None:
+                playwright = sync_playwright().start()
+                browser = playwright.chromium.launch(headless=True)
+                page = prepare_page(browser.new_page(), stats, block)
+            for link in tqdm(fallback, desc="Rendering fallback links", unit="link", disable=not fallback):
+                scraped_data[link] = scrape_data(page, link, stats)
+                time.sleep(delay)
+
+            # Write the batch files in input order, as the other modes do
+            for batch in chunks(window, batch_size):
+                save_batch(f'scraped_data_batch_{batch_number}.txt', {link: scraped_data.get(link) for link in batch},
+                           store, ledger)
+                batch_number += 1
+    finally:
+        if browser is not None:
+            browser.close()
+        if playwright is not None:
+            playwright.stop()
+
+# Serial scraping with one page and a fixed delay between links
+def run_serial(bug_links, batch_size=50, delay=2, store=None, ledger=None, first_batch=1, stats=None, block=True):
+    # Start Playwright and use headless browser
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = prepare_page(browser.new_page(), stats, block)
+
+        batch_number = first_batch
+        for batch in chunks(bug_links, batch_size):
+            batch_start_time = time.time()  # Track batch start time
+
+            scraped_data = {}
+            for link in tqdm(batch, desc=f"Scraping Progress (Batch {batch_number})", unit="link"):
+                scraped_data[link] = scrape_data(page, link, stats)
+                time.sleep(delay)
+
+            save_batch(f'scraped_data_batch_{batch_number}.txt', scraped_data, store, ledger)
+
+            batch_time_taken = time.time() - batch_start_time  # Calculate time taken for the batch
+            print(f"Batch {batch_number} time taken: {batch_time_taken:.2f} seconds")
+
+            batch_number += 1
+
+        # Close the browser when done
+        browser.close()
+
+# Pool of pages sharing one browser, with a concurrency limit per host
+class PagePool:
+    def __init__(self, browser, size, per_host_limit, stats=None, block=True):
+        self.browser = browser
+        self.size = size
+        self.per_host_limit = per_host_limit
+        self.stats = stats
+        self.block = block
+        self.pages = asyncio.Queue()
+        self.host_limits = {}
+
+    async def open(self):
+        for _ in range(self.size):
+            await self.pages.put(await prepare_page_async(await self.browser.new_page(), self.stats, self.block))
+
+    async def close(self):
+        while not self.pages.empty():
+            page = self.pages.get_nowait()
+            await page.close()
+
+    def host_limit(self, url):
+        host = urlparse(url).netloc
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self.host_limits[host]
+
+    # Run an action on a free page, taking the host slot first so pages are not held while waiting on a busy host
+    async def run(self, url, action):
+        async with self.host_limit(url):
+            page = await self.pages.get()
+            try:
+                return await action(page)
+            finally:
+                await self.pages.put(page)
+
+    async def scrape(self, url):
+        return await self.run(url, lambda page: scrape_data_async(page, url, self.stats))
+
+# Concurrent scraping with one shared Chromium and a bounded pool of pages
+async def run_concurrent(bug_links, batch_size=50, concurrency=8, per_host_limit=4, store=None, ledger=None, first_batch=1,
+                         stats=None, block=True):
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        pool = PagePool(browser, concurrency, per_host_limit, stats, block)
+        await pool.open()
+
+        batch_number = first_batch
+        for batch in chunks(bug_links, batch_size):
+            batch_start_time = time.time()  # Track batch start time
+
+            progress = tqdm(total=len(batch), desc=f"Scraping Progress (Batch {batch_number})", unit="link")
+
+            async def scrape_one(link):
+                content = await pool.scrape(link)
+                progress.update(1)
+                return content
+
+            results = await asyncio.gather(*(scrape_one(link) for link in batch))
+            progress.close()
+
+            # Keep the links in input order so the batch file matches the serial mode
+            save_batch(f'scraped_data_batch_{batch_number}.txt', dict(zip(batch, results)), store, ledger)
+
+            batch_time_taken = time.time() - batch_start_time  # Calculate time taken for the batch
+            print(f"Batch {batch_number} time taken: {batch_time_taken:.2f} seconds")
+
+            batch_number += 1
+
+        await pool.close()
+        await browser.close()
+
+def main():
+    # Setup logging here rather than at import, so modules that import the scraper keep their own logging
+    logging.basicConfig(filename='scraping_errors.log', level=logging.ERROR)
+    parser = argparse.ArgumentParser(description="Scrape Bugzilla bug pages into batch .txt files")
+    parser.add_argument('--input', default='bugsmini.xlsx', help="Excel file with a LINK column")
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--async', dest='use_async', action='store_true', help="Use the concurrent asyncio engine")
+    parser.add_argument('--concurrency', type=int, default=8, help="Number of pages in the pool (async mode)")
+    parser.add_argument('--per-host', type=int, default=4, help="Max concurrent requests per host (async mode)")
+    parser.add_argument('--bulk', choices=['xml', 'rest'], help="Fetch bugs in chunks through the Bugzilla XML or REST API")
+    parser.add_argument('--chunk-size', type=int, default=100, help="Bug IDs per bulk request")
+    parser.add_argument('--store', help="Also append every scraped bug to this record store directory")
+    add_ledger_arguments(parser)
+    add_browser_arguments(parser)
+    add_shard_argument(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    start_metrics(args)
+    stats = PageStats()
+    block = not args.no_block
+
+    # Skip finished links on --resume and only take failed ones on --retry-failed
+    ledger = ProgressLedger(args.ledger)
+    bug_links = ledger.plan(select_shard(read_bug_links(args.input), args.shard), args.resume, args.retry_failed)
+    first_batch = next_batch_number('scraped_data_batch_{}.txt') if args.resume or args.retry_failed else 1
 
     total_start_time = time.time()  # Track total start time
 
-    batch_number = 1
-    total_links_processed = 0
-    for batch in chunks(bug_links, 50):
-        batch_start_time = time.time()  # Track batch start time
-        
-        scraped_data = {}
-        for link in tqdm(batch, desc=f"Scraping Progress (Batch {batch_number})", unit="link"):
-            scraped_data[link] = scrape_data(page, link)
-            time.sleep(2)
-
-        # Save the scraped data for each batch in a separate .txt file
-        with open(f'scraped_data_batch_{batch_number}.txt', 'w', encoding='utf-8') as file:
-            for link, content in scraped_data.items():
-                if content:
-                    file.write(f"LINK: {link}\n")
-                    file.write(f"Short Description:\n{content['short_desc']}\n")
-                    file.write(f"Bug Column:\n{content['bug_column']}\n")
-                    file.write(f"Comments:\n{content['comments']}\n")
-                    file.write("-" * 80 + "\n")
-
-        batch_time_taken = time.time() - batch_start_time  # Calculate time taken for the batch
-        print(f"Batch {batch_number} time taken: {batch_time_taken:.2f} seconds")
-
-        total_links_processed += len(batch)
-        batch_number += 1
+    store = RecordStore(args.store) if args.store else None
+
+    if args.bulk:
+        run_bulk(bug_links, args.batch_size, args.chunk_size, args.bulk, store=store, ledger=ledger, first_batch=first_batch,
+                 stats=stats, block=block)
+    elif args.use_async:
+        asyncio.run(run_concurrent(bug_links, args.batch_size, args.concurrency, args.per_host,
+                                   store=store, ledger=ledger, first_batch=first_batch, stats=stats, block=block))
+    else:
+        run_serial(bug_links, args.batch_size, store=store, ledger=ledger, first_batch=first_batch, stats=stats, block=block)
+
+    if store is not None:
+        store.close()
 
     total_time_taken = time.time() - total_start_time  # Calculate total time taken
-    average_time_per_url = total_time_taken / total_links_processed  # Calculate average time per URL
+    average_time_per_url = total_time_taken / max(len(bug_links), 1)  # Calculate average time per URL
 
-    # Close the browser when done
-    browser.close()
+    print(f"Total time taken: {total_time_taken:.2f} seconds")
+    print(f"Average time per URL: {average_time_per_url:.2f} seconds")
+    print(ledger.summary())
+    ledger.close()
+    print(stats.report())
+    if args.page_stats:
+        stats.save_csv(args.page_stats)
+    finish_metrics(args)
 
-print(f"Total time taken: {total_time_taken:.2f} seconds")
-print(f"Average time per URL: {average_time_per_url:.2f} seconds")
+if __name__ == "__main__":
+    main()
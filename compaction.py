@@ -0,0 +1,239 @@
+import re
+from recordstore import RECORD_FIELDS, make_record, parse_bugzilla_text, parse_gnu_text, record_text
+
+MODEL = "gpt-4o-mini"
+
+# Fields kept whole first when a bug is over budget; the last fields are the ones truncated
+FIELD_PRIORITY = {
+    'bugzilla': ['short_desc', 'bug_column', 'comments'],
+    'gnu': ['bug_description', 'pkginfo', 'buginfo', 'first_message'],
+    'debian': ['bug_description', 'pkginfo', 'buginfo', 'first_message'],
+}
+
+# Free-text fields that carry mail and comment boilerplate worth stripping
+TEXT_FIELDS = {'comments', 'first_message'}
+# Fields that hold a raw mail, where headers, MIME parts and a trailing signature are stripped too
+MAIL_FIELDS = {'first_message'}
+
+# Every lower-priority field keeps at least this many tokens, however long the fields before it are
+MIN_FIELD_TOKENS = 64
+
+_QUOTED_LINE = re.compile(r'^\s*>')
+_REPLY_HEADER = re.compile(r'^\s*(On .{0,200}wrote:|\(In reply to .{0,200}\)|-+\s*Original Message\s*-+)\s*$', re.IGNORECASE)
+_SIGNATURE = re.compile(r'^-- ?$')
+_MAIL_HEADER = re.compile(
+    r'^(Received|Return-Path|Message-I[Dd]|In-Reply-To|References|DKIM-Signature|ARC-[\w-]+|Authentication-Results|'
+    r'X-[\w-]+|List-[\w-]+|Content-(Type|Transfer-Encoding|Disposition|ID|Language)|MIME-Version|Thread-(Topic|Index)|'
+    r'Precedence|Delivered-To|User-Agent):'
+)
+_HEADER_CONTINUATION = re.compile(r'^[ \t]+\S')
+_MIME_BOUNDARY = re.compile(r'^--[-=_.\w]{8,}(--)?$')
+_MIME_PREAMBLE = re.compile(r'^This is a (multi-part|MIME-encapsulated) message', re.IGNORECASE)
+_ATTACHMENT = re.compile(
+    r'^\s*(\[[^\]]*\([\w.+-]+/[\w.+-]+, (inline|attachment)\)\]|Created attachment \d+|Attachment #?\d+|'
+    r'\[?(attachment|Download) [^\n]*\.(patch|diff|txt|log|png|jpe?g|gz|xz|zip|tar)\]?)\s*$',
+    re.IGNORECASE,
+)
+_STACK_FRAME = re.compile(r'^\s*(#\d+\s+(0x[0-9a-f]+|\w)|at [\w$.<>]+\(|File ".*", line \d+|\d+\s+[\w.-]+\s+0x[0-9a-f]+)')
+_MAX_FRAMES = 25
+# A signature is only stripped when it is this short and ends the message
+_MAX_SIGNATURE_LINES = 10
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_encoding = None
+
+# tiktoken when it is installed and its encoding loads, otherwise about four characters per token
+def get_encoding():
+    global _encoding, tiktoken
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.encoding_for_model(MODEL)
+        except Exception:
+            tiktoken = None
+    return _encoding
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+# Keep the head and tail of a text within `limit` tokens, marking what was cut
+def truncate_tokens(text, limit):
+    total = count_tokens(text)
+    if total <= limit:
+        return text
+    head_tokens = limit * 2 // 3
+    tail_tokens = limit - head_tokens
+    encoding = get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text, disallowed_special=())
+        head = encoding.decode(tokens[:head_tokens])
+        tail = encoding.decode(tokens[len(tokens) - tail_tokens:]) if tail_tokens else ''
+    else:
+        head = text[:head_tokens * 4]
+        tail = text[len(text) - tail_tokens * 4:] if tail_tokens else ''
+    return f"{head}\n[... {total - limit} tokens truncated ...]\n{tail}"
+
+# The lines before a trailing mail signature: the last "-- " line, if only a few lines follow it
+def strip_signature(lines):
+    for i in range(len(lines) - 1, max(-1, len(lines) - _MAX_SIGNATURE_LINES - 2), -1):
+        if _SIGNATURE.match(lines[i]):
+            return lines[:i]
+    return lines
+
+# Drop quoted replies and attachment lists, and for mail also headers, MIME parts and the trailing signature
+def strip_boilerplate(text, mail=False):
+    lines = text.splitlines()
+    if mail:
+        lines = strip_signature(lines)
+    kept = []
+    in_header = False
+    for line in lines:
+        if mail and _MAIL_HEADER.match(line):
+            in_header = True
+            continue
+        if in_header and _HEADER_CONTINUATION.match(line):
+            continue
+        in_header = False
+        if mail and (_MIME_BOUNDARY.match(line) or _MIME_PREAMBLE.match(line)):
+            continue
+        if _QUOTED_LINE.match(line) or _REPLY_HEADER.match(line) or _ATTACHMENT.match(line):
+            continue
+        kept.append(line.rstrip())
+    return '\n'.join(kept)
+
+# Back-to-back traces in one block of frames: a new trace starts wherever the first frame shows up again
+def split_traces(frames):
+    traces = [[frames[0]]]
+    for frame in frames[1:]:
+        if frame.strip() == frames[0].strip():
+            traces.append([])
+        traces[-1].append(frame)
+    return traces
+
+# Collapse repeated lines and repeated stack traces, and cap very long traces
+def collapse_repetition(text):
+    lines = text.splitlines()
+    kept = []
+    seen_traces = set()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if _STACK_FRAME.match(line):
+            end = i
+            while end < len(lines) and _STACK_FRAME.match(lines[end]):
+                end += 1
+            for frames in split_traces(lines[i:end]):
+                key = tuple(frame.strip() for frame in frames)
+                if key in seen_traces:
+                    kept.append("[... same stack trace as above ...]")
+                    continue
+                seen_traces.add(key)
+                kept.extend(frames[:_MAX_FRAMES])
+                if len(frames) > _MAX_FRAMES:
+                    kept.append(f"[... {len(frames) - _MAX_FRAMES} more frames ...]")
+            i = end
+            continue
+        repeats = 1
+        while i + repeats < len(lines) and lines[i + repeats] == line:
+            repeats += 1
+        kept.append(line)
+        if repeats > 2 and line.strip():
+            kept.append(f"[... previous line repeated {repeats - 1} more times ...]")
+        elif repeats == 2:
+            kept.append(line)
+        i += repeats
+    return re.sub(r'\n{3,}', '\n\n', '\n'.join(kept)).strip()
+
+def clean_field(text, mail=False):
+    return collapse_repetition(strip_boilerplate(text, mail))
+
+# Shrinks each bug's prompt to a token budget before it is sent, and counts the tokens saved
+class PromptCompactor:
+    def __init__(self, budget=6000, enabled=True):
+        self.budget = budget
+        self.enabled = enabled
+        self.stats = {'bugs': 0, 'tokens_before': 0, 'tokens_after': 0, 'truncated': 0}
+
+    def compact_fields(self, tracker, fields):
+        fields = {field: '' if value is None else str(value) for field, value in fields.items()}
+        for field in TEXT_FIELDS.intersection(fields):
+            fields[field] = clean_field(fields[field], field in MAIL_FIELDS)
+        priority = FIELD_PRIORITY.get(tracker, RECORD_FIELDS[tracker])
+        counts = {field: count_tokens(fields[field]) for field in priority}
+        if self.budget is None or sum(counts.values()) <= self.budget:
+            return fields, False
+
+        remaining = self.budget
+        for position, field in enumerate(priority):
+            reserve = sum(min(counts[later], MIN_FIELD_TOKENS) for later in priority[position + 1:])
+            allowed = max(remaining - reserve, MIN_FIELD_TOKENS)
+            if counts[field] > allowed:
+                fields[field] = truncate_tokens(fields[field], allowed)
+                counts[field] = allowed
+            remaining -= counts[field]
+        return fields, True
+
+    def compact_record(self, record):
+        if not self.enabled:
+            return record
+        before = count_tokens(record_text(record))
+        fields, truncated = self.compact_fields(record['tracker'], {field: record[field] for field in RECORD_FIELDS[record['tracker']]})
+        compacted = dict(record, **fields)
+        self.count(before, count_tokens(record_text(compacted)), truncated)
+        return compacted
+
+    # Compact the text of one bug as it appears in the batch files
+    def compact_text(self, bug_data):
+        if not self.enabled:
+            return bug_data
+        if bug_data.startswith("Main URL: "):
+            tracker, parse_text = 'gnu', parse_gnu_text
+        else:
+            tracker, parse_text = 'bugzilla', parse_bugzilla_text
+        url, fields = parse_text(bug_data)
+        if url is None:
+            # Not in the scraped layout, so only the budget can be applied
+            before = count_tokens(bug_data)
+            text = truncate_tokens(bug_data, self.budget) if self.budget else bug_data
+            self.count(before, count_tokens(text), text is not bug_data)
+            return text
+        return record_text(self.compact_record(make_record(tracker, url, fields)))
+
+    def count(self, before, after, truncated):
+        self.stats['bugs'] += 1
+        self.stats['tokens_before'] += before
+        self.stats['tokens_after'] += after
+        self.stats['truncated'] += int(truncated)
+
+    # Wrap a summarizer's build_request so every bug is compacted first
+    def wrap(self, build_request):
+        if not self.enabled:
+            return build_request
+        return lambda bug_data: build_request(self.compact_text(bug_data))
+
+    def report(self):
+        if not self.enabled:
+            return "Prompt compaction: off"
+        before, after = self.stats['tokens_before'], self.stats['tokens_after']
+        saved = before - after
+        share = saved / before * 100 if before else 0
+        report = (f"Prompt compaction: {self.stats['bugs']} bugs, {before} -> {after} tokens "
+                  f"(saved {saved}, {share:.1f}%), {self.stats['truncated']} truncated to the {self.budget}-token field budget")
+        if get_encoding() is None:
+            report += ("\nToken counts are estimates (about 4 characters per token) because tiktoken is not available; "
+                       "the budgets above are approximate too")
+        return report
+
+# Command-line options shared by the summarizers and the pipeline
+def add_compaction_arguments(parser):
+    parser.add_argument('--token-budget', type=int, default=6000, help="Max prompt tokens per bug after compaction")
+    parser.add_argument('--no-compact', action='store_true', help="Send the scraped text unchanged")
+
+def compactor_from_args(args):
+    return PromptCompactor(budget=args.token_budget, enabled=not args.no_compact)
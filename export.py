@@ -0,0 +1,207 @@
+import argparse
+import csv
+import os
+import xlsxwriter
+from xlsxwriter.exceptions import FileCreateError
+
+FORMATS = ('xlsx', 'csv', 'parquet')
+SHEET_NAME = 'Bug Details'
+MAX_COLUMN_WIDTH = 255  # Excel's limit
+# Raised when the target file is open in Excel: xlsxwriter reports it from close(), the CSV and Parquet sinks from open
+FILE_ERRORS = (PermissionError, FileCreateError)
+
+def _cell(row, column):
+    value = row.get(column)
+    if value is None or value != value:  # Missing or NaN, the same cells fillna("N/A") used to fill
+        return "N/A"
+    return value if isinstance(value, str) else str(value)
+
+# Constant-memory xlsx writer: every row goes straight to disk and column widths grow as rows arrive
+class ExcelSink:
+    def __init__(self, path, columns=None):
+        self.path = path
+        self.workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        self.worksheet = self.workbook.add_worksheet(SHEET_NAME)
+        self.header_format = self.workbook.add_format({'bold': True, 'text_wrap': True, 'valign': 'top', 'border': 1})
+        self.cell_format = self.workbook.add_format({'text_wrap': True, 'valign': 'top'})
+        self.columns = None
+        self.widths = []
+        self.rows = 0
+        if columns is not None:
+            self._start(list(columns))
+
+    def _start(self, columns):
+        self.columns = columns
+        self.widths = [len(column) for column in columns]
+        for i, column in enumerate(columns):
+            self.worksheet.write_string(0, i, column, self.header_format)
+
+    def write(self, row):
+        if self.columns is None:
+            self._start(list(row))
+        self.rows += 1
+        for i, column in enumerate(self.columns):
+            value = _cell(row, column)
+            self.worksheet.write_string(self.rows, i, value, self.cell_format)
+            if len(value) > self.widths[i]:
+                self.widths[i] = len(value)
+
+    def close(self):
+        for i, width in enumerate(self.widths):
+            self.worksheet.set_column(i, i, min(width + 2, MAX_COLUMN_WIDTH))
+        self.workbook.close()
+
+class CsvSink:
+    def __init__(self, path, columns=None):
+        self.path = path
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = None
+        self.columns = None
+        if columns is not None:
+            self._start(list(columns))
+
+    def _start(self, columns):
+        self.columns = columns
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, row):
+        if self.columns is None:
+            self._start(list(row))
+        self.writer.writerow([_cell(row, column) for column in self.columns])
+
+    def close(self):
+        self.file.close()
+
+# Parquet file written one row group at a time, so only `row_group_size` rows are ever held
+class ParquetSink:
+    def __init__(self, path, columns=None, row_group_size=5000):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.row_group_size = row_group_size
+        self.columns = list(columns) if columns is not None else None
+        self.writer = None
+        self.pending = []
+
+    def write(self, row):
+        if self.columns is None:
+            self.columns = list(row)
+        self.pending.append([_cell(row, column) for column in self.columns])
+        if len(self.pending) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self.columns is None:
+            return
+        schema = self.pa.schema([(column, self.pa.string()) for column in self.columns])
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, schema)
+        if self.pending:
+            table = self.pa.Table.from_arrays([self.pa.array(values, self.pa.string()) for values in zip(*self.pending)],
+                                              schema=schema)
+            self.writer.write_table(table)
+            self.pending = []
+
+    def close(self):
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+
+SINKS = {'xlsx': ExcelSink, 'csv': CsvSink, 'parquet': ParquetSink}
+
+# Run a file operation, waiting for the user to close the file in Excel if it is open
+def _retry(action, path):
+    while True:
+        try:
+            return action()
+        except FILE_ERRORS:
+            input(f"The file '{path}' is open. Please close it and press Enter to try again.")
+
+# Writes the same rows to one file per format, e.g. combined_bug_details.xlsx and combined_bug_details.csv
+class RowWriter:
+    def __init__(self, base_path, formats=('xlsx',), columns=None):
+        self.paths = [f"{base_path}.{fmt}" for fmt in formats]
+        self.sinks = []
+        self.rows = 0
+        try:
+            for fmt, path in zip(formats, self.paths):
+                self.sinks.append(_retry(lambda: SINKS[fmt](path, columns), path))
+        except BaseException:
+            self.close()
+            raise
+
+    def write(self, row):
+        for sink in self.sinks:
+            sink.write(row)
+        self.rows += 1
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write(row)
+
+    # Every sink is closed even if an earlier one fails, so one locked file never loses the others
+    def close(self):
+        error = None
+        for sink in self.sinks:
+            try:
+                _retry(sink.close, sink.path)
+            except BaseException as e:
+                error = error or e
+        self.sinks = []
+        if error is not None:
+            raise error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+# Write a batch of rows; RowWriter waits for the user to close the workbook in Excel if it is open
+def save_rows(base_path, rows, formats=('xlsx',)):
+    with RowWriter(base_path, formats) as writer:
+        writer.write_rows(rows)
+    return writer.paths
+
+# Rows of an xlsx, csv or parquet file written by RowWriter, as dicts, read one at a time
+def _read_xlsx(path):
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        for values in rows:
+            yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+def _read_csv(path):
+    with open(path, 'r', newline='', encoding='utf-8') as file:
+        yield from csv.DictReader(file)
+
+def _read_parquet(path):
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(path).iter_batches():
+        yield from batch.to_pylist()
+
+READERS = {'xlsx': _read_xlsx, 'csv': _read_csv, 'parquet': _read_parquet}
+
+def read_rows(path):
+    return READERS[os.path.splitext(path)[1][1:]](path)
+
+def parse_formats(value):
+    formats = [fmt.strip() for fmt in value.split(',') if fmt.strip()]
+    for fmt in formats:
+        if fmt not in FORMATS:
+            raise argparse.ArgumentTypeError(f"Unknown export format {fmt!r}, expected some of {', '.join(FORMATS)}")
+    return formats
+
+# Command-line option shared by the summarizers and the pipeline
+def add_export_arguments(parser):
+    parser.add_argument('--export', type=parse_formats, default=['xlsx'],
+                        help="Comma-separated output formats: xlsx, csv, parquet")
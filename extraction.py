@@ -0,0 +1,116 @@
+import argparse
+import csv
+import json
+import re
+from collections import Counter
+from metrics import metrics
+
+SECTIONS = ["Bug Description", "Reproduction Steps", "Bug Type", "System Call Name", "Process/Application Interleaving", "Processes/Signals/Interrupts"]
+
+SYSTEM_PROMPT = (
+    "Summarize the bug report. Reply with a JSON object with exactly these keys, each holding a string: "
+    + ", ".join(f'"{section}"' for section in SECTIONS) + ". Use \"N/A\" for anything the report does not say."
+)
+RESPONSE_FORMAT = {'type': 'json_object'}
+
+# Parse Status values: all sections from JSON, all sections from plain text, some sections missing, nothing usable
+JSON, TEXT, PARTIAL, FAILED = 'json', 'text', 'partial', 'failed'
+
+_CODE_FENCE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$')
+# Section headers at the start of a line, optionally in markdown bold or as list items, followed by ':' or the line end
+_SECTION_HEADER = re.compile(
+    r'^[ \t>#*-]*(' + '|'.join(re.escape(section) for section in SECTIONS) + r')[ \t*]*(?::[ \t*]*|$)',
+    re.MULTILINE | re.IGNORECASE,
+)
+_SECTION_NAMES = {section.lower(): section for section in SECTIONS}
+
+def _key(name):
+    return re.sub(r'[^a-z]', '', name.lower())
+
+_SECTION_KEYS = {_key(section): section for section in SECTIONS}
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return '\n'.join(_text(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value).strip()
+
+# The sections present in a JSON object, matching keys regardless of case, spacing and punctuation
+def sections_from_json(data):
+    found = {}
+    for name, value in data.items():
+        section = _SECTION_KEYS.get(_key(str(name)))
+        if section is not None and _text(value):
+            found[section] = _text(value)
+    return found
+
+# JSON object, or None if the text is not one
+def load_json_object(response_text):
+    try:
+        data = json.loads(_CODE_FENCE.sub('', response_text))
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+# One pass over the headers; each section runs until the next header
+def sections_from_text(response_text):
+    found = {}
+    matches = list(_SECTION_HEADER.finditer(response_text))
+    for match, following in zip(matches, matches[1:] + [None]):
+        section = _SECTION_NAMES[match.group(1).lower()]
+        end = following.start() if following else len(response_text)
+        value = response_text[match.end():end].strip()
+        if value and section not in found:
+            found[section] = value
+    return found
+
+# Output row for one response, with every section present and a Parse Status saying how it was read
+def extract_bug_details(response_text, url):
+    data = load_json_object(response_text)
+    if data is not None:
+        found, status = sections_from_json(data), JSON
+    else:
+        found, status = sections_from_text(response_text), TEXT
+    if not found:
+        status = FAILED
+    elif len(found) < len(SECTIONS):
+        status = PARTIAL
+    details = {"URL": url}
+    details.update((section, found.get(section, "N/A")) for section in SECTIONS)
+    details["Parse Status"] = status
+    metrics.count(f"parse_{status}")
+    return details
+
+# Re-parse every cached response without calling the API, and report how each one parses
+def reparse_cache(cache_path, failures_path=None):
+    from responsecache import ResponseCache
+    cache = ResponseCache(cache_path)
+    statuses = Counter()
+    failures = []
+    for key, response_text in cache.iter_responses():
+        status = extract_bug_details(response_text, None)["Parse Status"]
+        statuses[status] += 1
+        if status in (PARTIAL, FAILED):
+            failures.append({'key': key, 'status': status, 'response': response_text[:500]})
+    cache.close()
+    if failures_path:
+        with open(failures_path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=['key', 'status', 'response'])
+            writer.writeheader()
+            writer.writerows(failures)
+    return statuses
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-parse cached summaries without calling the API")
+    parser.add_argument('--cache', default="response_cache.sqlite", help="Response cache database")
+    parser.add_argument('--failures', help="Write partial and failed parses to this CSV file")
+    args = parser.parse_args()
+    statuses = reparse_cache(args.cache, args.failures)
+    print(f"Re-parsed {sum(statuses.values())} cached responses: "
+          + ", ".join(f"{status}: {statuses[status]}" for status in (JSON, TEXT, PARTIAL, FAILED)))
+
+if __name__ == "__main__":
+    main()
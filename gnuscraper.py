@@ -1,61 +1,326 @@
+import argparse
+import re
+from html import escape
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+import lxml.html
 from tqdm import tqdm
 from playwright.sync_api import sync_playwright
+from recordstore import RecordStore, debbugs_tracker
+from browserutil import WAIT_STRATEGIES, PageStats, add_browser_arguments, goto_and_wait, prepare_page
+from ledger import ProgressLedger, add_ledger_arguments, next_batch_number
+from sharding import add_shard_argument, select_shard
+from metrics import add_metrics_arguments, finish_metrics, metrics, start_metrics
 
 def read_urls_from_excel(file_path):
     df = pd.read_excel(file_path, usecols=['LINK'], dtype=str)
     return df['LINK'].dropna().tolist()
 
-def scrape_gnu_data(urls, start_index, end_index):
+# Long-lived browser session that can be reused across batches
+class GnuScraperSession:
+    def __init__(self, recycle_after=200, headless=True, stats=None, block=True):
+        self.recycle_after = recycle_after  # Open a fresh page after this many navigations
+        self.headless = headless
+        self.stats = stats
+        self.block = block  # Abort images, CSS, fonts, media and analytics
+        self.playwright = None
+        self.browser = None
+        self.page = None
+        self.navigations = 0
+
+    def start(self):
+        self.playwright = sync_playwright().start()
+        self.browser = self.playwright.chromium.launch(headless=self.headless)
+        self.page = self.new_page()
+        self.navigations = 0
+        return self
+
+    def new_page(self):
+        return prepare_page(self.browser.new_page(), self.stats, self.block)
+
+    def close(self):
+        if self.browser:
+            self.browser.close()
+            self.browser = None
+        if self.playwright:
+            self.playwright.stop()
+            self.playwright = None
+        self.page = None
+
+    # The browser is only launched when a page is first needed
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # Return a page for the next navigation, recycling it to keep memory flat
+    def get_page(self):
+        if self.browser is None:
+            self.start()
+        if self.recycle_after and self.navigations >= self.recycle_after:
+            self.page.close()
+            self.page = self.new_page()
+            self.navigations = 0
+        self.navigations += 1
+        return self.page
+
+# Extract the bug fields from a rendered debbugs page
+def extract_gnu_record(page):
+    # Extract the h1 element and get its inner HTML
+    h1_element = page.query_selector("h1")
+    if h1_element:
+        h1_inner_html = h1_element.inner_html()
+        # Split the inner HTML by <br> and take the second part if it exists
+        parts = h1_inner_html.split('<br>')
+        bug_description = parts[1].strip() if len(parts) > 1 else "No text after <br> found"
+    else:
+        bug_description = "No h1 found"
+
+    pkginfo = page.query_selector("div.pkginfo").inner_text() if page.query_selector("div.pkginfo") else "No pkginfo found"
+    buginfo = page.query_selector("div.buginfo").inner_text() if page.query_selector("div.buginfo") else "No buginfo found"
+
+    # Find the first pre.message
+    pre_messages = page.query_selector_all("pre.message")
+    first_message = pre_messages[0].inner_text() if pre_messages else "No message found"
+
+    # Ignore pre.mime and pre.headers
+    if page.query_selector("pre.mime"):
+        mime_text = page.query_selector("pre.mime").inner_text()
+        first_message = first_message.replace(mime_text, "")
+    if page.query_selector("pre.headers"):
+        headers_text = page.query_selector("pre.headers").inner_text()
+        first_message = first_message.replace(headers_text, "")
+
+    return {'bug_description': bug_description, 'pkginfo': pkginfo, 'buginfo': buginfo, 'first_message': first_message}
+
+# HTTP session with pooled keep-alive connections for the browserless backend
+def make_http_session(pool_size=16):
+    http = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=2)
+    http.mount('http://', adapter)
+    http.mount('https://', adapter)
+    http.headers['User-Agent'] = 'Mozilla/5.0 (compatible; Bug-Scraper-Summarizer)'
+    return http
+
+# Elements Chromium lays out as blocks by default; each starts and ends a line
+_BLOCK_TAGS = {'address', 'article', 'aside', 'blockquote', 'body', 'caption', 'center', 'dd', 'details', 'dialog',
+               'dir', 'div', 'dl', 'dt', 'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4',
+               'h5', 'h6', 'header', 'hgroup', 'hr', 'html', 'legend', 'li', 'listing', 'main', 'menu', 'nav', 'ol',
+               'pre', 'section', 'summary', 'table', 'ul', 'xmp'}
+_HIDDEN_TAGS = {'head', 'link', 'meta', 'noscript', 'script', 'style', 'template', 'title'}
+_PRESERVE_TAGS = {'listing', 'pre', 'textarea', 'xmp'}
+_WHITESPACE = re.compile(r'[ \t\n\r\f]+')
+
+def _is_hidden(el):
+    return el.get('hidden') is not None or 'display:none' in (el.get('style') or '').replace(' ', '').lower()
+
+# The rest of the row (or table) holds another cell (or row), so this one is followed by a tab (or newline)
+def _has_next_cell(el):
+    return any(sibling.tag in ('td', 'th') for sibling in el.itersiblings())
+
+def _has_next_row(el):
+    table = next(el.iterancestors('table'), None)
+    if table is None:
+        return False
+    rows = [row for row in table.iter('tr') if next(row.iterancestors('table'), None) is table]
+    return rows[-1] is not el
+
+# Playwright's inner_text for a parsed element, following the HTML innerText steps: whitespace collapses outside
+# <pre>, blocks start a new line, paragraphs are set off by a blank line, <br> and table rows end a line and the
+# cells of a row are tab-separated
+def html_inner_text(element):
+    # Strings as ('text', collapsible), ('pre', preserved) or ('sep', forced newline or tab), and ints counting
+    # the line breaks required around blocks
+    items = []
+
+    def add_text(text, preserve):
+        if text:
+            items.append(('pre', text) if preserve else ('text', _WHITESPACE.sub(' ', text)))
+
+    def walk(el, preserve):
+        tag = el.tag.lower() if isinstance(el.tag, str) else None
+        if tag is None or tag in _HIDDEN_TAGS or _is_hidden(el):
+            return
+        if tag == 'br':
+            items.append(('sep', '\n'))
+            return
+        breaks = 2 if tag == 'p' else 1 if tag in _BLOCK_TAGS else 0
+        preserve = preserve or tag in _PRESERVE_TAGS
+        items.append(breaks)
+        text = el.text
+        if text and tag in ('pre', 'listing', 'textarea') and text.startswith('\n'):
+            text = text[1:]  # Browsers drop the newline right after the start tag; lxml keeps it
+        add_text(text, preserve)
+        for child in el:
+            walk(child, preserve)
+            add_text(child.tail, preserve)
+        items.append(breaks)
+        if tag in ('td', 'th') and _has_next_cell(el):
+            items.append(('sep', '\t'))
+        elif tag == 'tr' and _has_next_row(el):
+            items.append(('sep', '\n'))
+
+    walk(element, False)
+
+    out = []
+    breaks = 0  # Required line breaks waiting for the next text; dropped at the start and the end
+    space = False  # Collapsed space waiting for more text on the same line
+    line_start = True
+    for item in items:
+        if isinstance(item, int):
+            breaks = max(breaks, item)
+            continue
+        kind, value = item
+        trailing = False
+        if kind == 'text':
+            space = space or value.startswith(' ')
+            trailing = value.endswith(' ')
+            value = value.strip(' ')
+            if not value:
+                continue
+        if breaks and out:
+            out.append('\n' * breaks)
+            line_start = True
+        breaks = 0
+        if kind == 'sep':
+            out.append(value)
+            line_start, space = True, False
+            continue
+        if space and not line_start:
+            out.append(' ')
+        out.append(value)
+        line_start, space = value.endswith('\n'), trailing
+    return ''.join(out)
+
+# First element with the given tag and class, like page.query_selector("tag.class")
+def _first_by_class(doc, tag, cls):
+    found = doc.xpath(f"//{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {cls} ')]")
+    return found[0] if found else None
+
+# Extract the same fields as extract_gnu_record from static HTML
+def extract_gnu_record_html(html):
+    # Browsers turn CRLF into LF before parsing
+    doc = lxml.html.fromstring(html.replace('\r\n', '\n').replace('\r', '\n'))
+
+    h1_elements = doc.xpath('//h1')
+    if h1_elements:
+        h1_element = h1_elements[0]
+        # Serialized the way the browser's inner_html does it, escaping text and writing non-breaking spaces as &nbsp;
+        h1_inner_html = (escape(h1_element.text or '', quote=False) + ''.join(
+            lxml.html.tostring(child, encoding='unicode') for child in h1_element)).replace('\xa0', '&nbsp;')
+        parts = h1_inner_html.split('<br>')
+        bug_description = parts[1].strip() if len(parts) > 1 else "No text after <br> found"
+    else:
+        bug_description = "No h1 found"
+
+    pkginfo_element = _first_by_class(doc, 'div', 'pkginfo')
+    buginfo_element = _first_by_class(doc, 'div', 'buginfo')
+    pkginfo = html_inner_text(pkginfo_element) if pkginfo_element is not None else "No pkginfo found"
+    buginfo = html_inner_text(buginfo_element) if buginfo_element is not None else "No buginfo found"
+
+    message_element = _first_by_class(doc, 'pre', 'message')
+    first_message = html_inner_text(message_element) if message_element is not None else "No message found"
+
+    # Ignore pre.mime and pre.headers
+    for cls in ('mime', 'headers'):
+        element = _first_by_class(doc, 'pre', cls)
+        if element is not None:
+            first_message = first_message.replace(html_inner_text(element), "")
+
+    return {'bug_description': bug_description, 'pkginfo': pkginfo, 'buginfo': buginfo, 'first_message': first_message}
+
+# Fetch a bug page over HTTP and extract it without a browser
+def fetch_gnu_record(http, url, timeout=30, stats=None):
+    start_time = time.perf_counter()
+    with metrics.span('http_fetch', url):
+        response = http.get(url, timeout=timeout)
+        response.raise_for_status()
+    if stats is not None:
+        stats.add(url, time.perf_counter() - start_time, len(response.content))
+    with metrics.span('extract', url):
+        record = extract_gnu_record_html(response.text)
+    # Anything without the debbugs heading is not a static bug page, let the browser handle it
+    if record['bug_description'] == "No h1 found":
+        raise ValueError("No h1 found in static HTML")
+    return record
+
+# Render one bug page in the browser session and extract it
+def scrape_gnu_page(session, url):
+    page = session.get_page()
+    if session.stats is not None:
+        session.stats.begin(page, url)
+    try:
+        # Proceed as soon as the heading is in the DOM instead of waiting for the network to go idle
+        goto_and_wait(page, url, WAIT_STRATEGIES['gnu'])
+        with metrics.span('extract', url):
+            return extract_gnu_record(page)
+    finally:
+        if session.stats is not None:
+            session.stats.end(page)
+
+# Format the data to include the bug description
+def format_gnu_record(url, record):
+    return (f"Main URL: {url}\n"
+            f"Bug Description: {record['bug_description']}\n"
+            f"PKGINFO:\n{record['pkginfo']}\n\n"
+            f"BUGINFO:\n{record['buginfo']}\n\n"
+            f"FIRST MESSAGE:\n{record['first_message']}\n")
+
+def scrape_gnu_data(urls, start_index, end_index, session=None, backend="browser", http=None, workers=8, store=None, ledger=None):
     scraped_data = []
     error_log = []
+    batch_urls = urls[start_index:end_index]
+    records = {}
+
+    # Fast path: fetch static pages over HTTP, anything that fails goes to the browser
+    if backend == "http":
+        if http is None:
+            http = make_http_session(workers)
+
+        def fetch(url):
+            try:
+                return url, fetch_gnu_record(http, url, stats=session.stats if session else None)
+            except Exception:
+                return url, None
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for url, record in tqdm(executor.map(fetch, batch_urls), total=len(batch_urls), desc="Fetching URLs"):
+                if record is not None:
+                    records[url] = record
 
-        for url in tqdm(urls[start_index:end_index], desc="Scraping URLs"):
-            page.goto(url)
-            page.wait_for_load_state("networkidle")  # Wait for the page to load completely
+    # Without a shared session, launch a browser just for this batch
+    owns_session = session is None
+    if owns_session:
+        session = GnuScraperSession()
 
+    try:
+        for url in tqdm([url for url in batch_urls if url not in records], desc="Scraping URLs"):
             try:
-                # Extract the h1 element and get its inner HTML
-                h1_element = page.query_selector("h1")
-                if h1_element:
-                    h1_inner_html = h1_element.inner_html()
-                    # Split the inner HTML by <br> and take the second part if it exists
-                    parts = h1_inner_html.split('<br>')
-                    bug_description = parts[1].strip() if len(parts) > 1 else "No text after <br> found"
-                else:   
-                    bug_description = "No h1 found"
-
-                pkginfo = page.query_selector("div.pkginfo").inner_text() if page.query_selector("div.pkginfo") else "No pkginfo found"
-                buginfo = page.query_selector("div.buginfo").inner_text() if page.query_selector("div.buginfo") else "No buginfo found"
-
-                # Find the first pre.message
-                pre_messages = page.query_selector_all("pre.message")
-                first_message = pre_messages[0].inner_text() if pre_messages else "No message found"
-
-                # Ignore pre.mime and pre.headers
-                if page.query_selector("pre.mime"):
-                    mime_text = page.query_selector("pre.mime").inner_text()
-                    first_message = first_message.replace(mime_text, "")
-                if page.query_selector("pre.headers"):
-                    headers_text = page.query_selector("pre.headers").inner_text()
-                    first_message = first_message.replace(headers_text, "")
-
-                # Format the data to include the bug description
-                data = (f"Main URL: {url}\n"
-                        f"Bug Description: {bug_description}\n"
-                        f"PKGINFO:\n{pkginfo}\n\n"
-                        f"BUGINFO:\n{buginfo}\n\n"
-                        f"FIRST MESSAGE:\n{first_message}\n")
-                scraped_data.append(data)
+                records[url] = scrape_gnu_page(session, url)
             except Exception as e:
                 error_log.append(f"URL: {url}\nError: {e}\n")
-                scraped_data.append(f"URL: {url}\nError: {e}\n")  # Append error to the scraped data as well
+                if ledger is not None:
+                    ledger.mark_failed(url, e)
+                records[url] = f"URL: {url}\nError: {e}\n"  # Append error to the scraped data as well
+    finally:
+        if owns_session:
+            session.close()
 
-        browser.close()
+    # Keep the input order regardless of which backend produced each record
+    for url in batch_urls:
+        record = records[url]
+        if isinstance(record, str):
+            scraped_data.append(record)
+            continue
+        scraped_data.append(format_gnu_record(url, record))
+        if store is not None:
+            store.add(debbugs_tracker(url), url, record)
+    if store is not None:
+        store.flush()
 
     # Log errors to a separate file if any
     if error_log:
@@ -71,28 +336,67 @@ def save_data_to_txt(file_path, data):
             file.write(entry + '\n' + ('='*80) + '\n')
 
 def main():
+    parser = argparse.ArgumentParser(description="Scrape GNU/Debian debbugs pages into batch .txt files")
+    parser.add_argument('--input', default="GNUmini.xlsx", help="Excel file with a LINK column")
+    parser.add_argument('--backend', choices=['http', 'browser'], default='browser',
+                        help="browser renders every page; http fetches static HTML and falls back to the browser "
+                             "(check it with paritycheck.py first)")
+    parser.add_argument('--workers', type=int, default=8, help="Concurrent HTTP fetches (http backend)")
+    parser.add_argument('--recycle-after', type=int, default=200,
+                        help="Open a fresh browser page after this many navigations (0 never recycles)")
+    parser.add_argument('--store', help="Also append every scraped bug to this record store directory")
+    add_ledger_arguments(parser)
+    add_browser_arguments(parser)
+    add_shard_argument(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    start_metrics(args)
+    stats = PageStats()
+
     # Path to your Excel file
-    excel_file_path = "GNUmini.xlsx"
+    excel_file_path = args.input
 
-    # Read URLs from Excel
-    urls = read_urls_from_excel(excel_file_path)
+    # Read URLs from Excel, skipping finished ones on --resume and taking only failed ones on --retry-failed
+    ledger = ProgressLedger(args.ledger)
+    urls = ledger.plan(select_shard(read_urls_from_excel(excel_file_path), args.shard), args.resume, args.retry_failed)
+    first_batch = next_batch_number('scraped_gnu_data_batch_{}.txt') if args.resume or args.retry_failed else 1
 
     # Set the batch size
     batch_size = 50
     num_batches = len(urls) // batch_size + (1 if len(urls) % batch_size != 0 else 0)
 
-    for batch_num in range(num_batches):
-        start_index = batch_num * batch_size
-        end_index = start_index + batch_size
+    http = make_http_session(args.workers)
+    store = RecordStore(args.store) if args.store else None
+
+    # Launch the browser once (if needed at all) and reuse it for every batch
+    with GnuScraperSession(recycle_after=args.recycle_after, stats=stats, block=not args.no_block) as session:
+        for batch_num in range(num_batches):
+            start_index = batch_num * batch_size
+            end_index = start_index + batch_size
+
+            # Scrape data from URLs
+            scraped_data = scrape_gnu_data(urls, start_index, end_index, session=session,
+                                           backend=args.backend, http=http, workers=args.workers, store=store,
+                                           ledger=ledger)
+
+            # Save scraped data to a .txt file
+            txt_file_path = f"scraped_gnu_data_batch_{first_batch + batch_num}.txt"
+            save_data_to_txt(txt_file_path, scraped_data)
 
-        # Scrape data from URLs
-        scraped_data = scrape_gnu_data(urls, start_index, end_index)
+            # Only entries that made it into the batch file count as done
+            ledger.mark_done([entry[len("Main URL: "):entry.index("\n")] for entry in scraped_data
+                              if entry.startswith("Main URL: ")])
 
-        # Save scraped data to a .txt file
-        txt_file_path = f"scraped_gnu_data_batch_{batch_num + 1}.txt"
-        save_data_to_txt(txt_file_path, scraped_data)
+            print(f"Data saved to {txt_file_path}")
 
-        print(f"Data saved to {txt_file_path}")
+    if store is not None:
+        store.close()
+    print(ledger.summary())
+    ledger.close()
+    print(stats.report())
+    if args.page_stats:
+        stats.save_csv(args.page_stats)
+    finish_metrics(args)
 
 if __name__ == "__main__":
     main()
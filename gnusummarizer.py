@@ -1,155 +1,77 @@
 import os
+import argparse
+import asyncio
 import openai
-import pandas as pd
-import time
-from tqdm import tqdm
+from compaction import add_compaction_arguments
+from export import add_export_arguments
+# Shared JSON-first parser, so both trackers produce the same columns and Parse Status
+from extraction import RESPONSE_FORMAT, SYSTEM_PROMPT
+from llmscheduler import add_scheduler_arguments
+from metrics import add_metrics_arguments, finish_metrics, start_metrics
+from packing import add_packing_arguments
+from recordstore import DEBBUGS_TRACKERS
+from summarizing import iter_batch_files, iter_store_batches, summarize_batches
 
 # Initialize the OpenAI client
 openai.api_key = os.getenv("OPENAI_API_KEY")  # Ensure you have set the environment variable
 
+MODEL = "gpt-4o-mini"
+REQUEST_PARAMS = {'temperature': 1, 'max_tokens': 2048, 'top_p': 1, 'frequency_penalty': 0, 'presence_penalty': 0,
+                  'response_format': RESPONSE_FORMAT}
+
 # Function to parse the scraped data
 def parse_scraped_data(file_path):
     bugs_data = []
     urls = []
     with open(file_path, 'r', encoding='utf-8') as file:
-        current_bug = ""
+        current_lines = []
         current_url = ""
+        at_record_start = True  # A new bug can only start at the top of the file or after a delimiter row
         for line in file:
-            if line.strip().startswith("Main URL"):  # Start of new bug
-                if current_bug:  # Save previous bug data
-                    bugs_data.append(current_bug.strip())
-                    urls.append(current_url.strip())
-                current_bug = line
-                current_url = line.split("Main URL: ")[1].strip()
+            if at_record_start and line.startswith("Main URL: "):  # Start of new bug
+                if current_lines:  # Save previous bug data
+                    bugs_data.append("".join(current_lines).strip())
+                    urls.append(current_url)
+                current_lines = [line]
+                current_url = line[len("Main URL: "):].strip()
             else:
-                current_bug += line
-        if current_bug:  # Add the last bug data
-            bugs_data.append(current_bug.strip())
-            urls.append(current_url.strip())
+                current_lines.append(line)
+            at_record_start = line.rstrip("\n") == "=" * 80
+        if current_lines:  # Add the last bug data
+            bugs_data.append("".join(current_lines).strip())
+            urls.append(current_url)
     return bugs_data, urls
 
-# Function to extract details from the response
-def extract_bug_details(response_text, url):
-    details = {"URL": url}
-    sections = ["Bug Description", "Reproduction Steps", "Bug Type", "System Call Name", "Process/Application Interleaving", "Processes/Signals/Interrupts"]
-    for section in sections:
-        start = response_text.find(section + ":") + len(section + ":")
-        end = response_text.find("\n", start)
-        if end == -1:  # if not found, set it to the end of the text
-            end = len(response_text)
-        details[section] = response_text[start:end].strip()
-    return details
-
-# Create a folder for the Excel files if it doesn't exist
-output_folder = "excel_files"
-if not os.path.exists(output_folder):
-    os.makedirs(output_folder)
-
-# Collect all responses for the final combined file
-all_responses = []
-
-# Collect responses and process the data files in batches
-batch_number = 1
-while True:
-    try:
-        # Load and parse the file
-        file_path = f"scraped_gnu_data_batch_{batch_number}.txt"
-        bugs_data, urls = parse_scraped_data(file_path)
-
-        # Check if there are no more files to process
-        if not bugs_data:
-            print("No more files to process.")
-            break
-
-        responses = []
-
-        # Split bugs_data and urls into sub-batches
-        sub_batch_size = 5  # Adjust the size to avoid exceeding token limits
-        for i in range(0, len(bugs_data), sub_batch_size):
-            sub_bugs_data = bugs_data[i:i + sub_batch_size]
-            sub_urls = urls[i:i + sub_batch_size]
-
-            # Send each sub-batch to GPT and process response with a progress bar
-            for bug_data, url in tqdm(zip(sub_bugs_data, sub_urls), desc=f"Processing Batch {batch_number}, Sub-batch {i // sub_batch_size + 1}", total=len(sub_bugs_data)):
-                try:
-                    response = openai.ChatCompletion.create(
-                        model="gpt-4o-mini",
-                        messages=[
-                            {
-                                "role": "system",
-                                "content": "Give results in this way only:\nBug Description:\nReproduction Steps\nBug Type\nSystem Call Name\nProcess/Application Interleaving\nProcesses/Signals/Interrupts"
-                            },
-                            {
-                                "role": "user",
-                                "content": bug_data
-                            }
-                        ],
-                        temperature=1,
-                        max_tokens=2048,
-                        top_p=1,
-                        frequency_penalty=0,
-                        presence_penalty=0
-                    )
-
-                    response_text = response['choices'][0]['message']['content']
-                    bug_details = extract_bug_details(response_text, url)
-                    responses.append(bug_details)
-                    all_responses.append(bug_details)
-                except openai.error.InvalidRequestError as e:
-                    print(f"Error processing sub-batch {i // sub_batch_size + 1}: {e}")
-                    continue
-
-        # Convert responses to DataFrame with separate columns
-        df = pd.DataFrame(responses)
-
-        # Replace empty cells with "N/A"
-        df.fillna("N/A", inplace=True)
-
-        # Save to Excel with retry mechanism and adjust column widths
-        while True:
-            try:
-                excel_file_path = os.path.join(output_folder, f"extracted_bug_details_batch_{batch_number}.xlsx")
-                with pd.ExcelWriter(excel_file_path, engine='xlsxwriter') as writer:
-                    df.to_excel(writer, index=False, sheet_name='Bug Details')
-
-                    # Access the XlsxWriter workbook and worksheet objects
-                    workbook = writer.book
-                    worksheet = writer.sheets['Bug Details']
-
-                    # Set the column widths
-                    for i, col in enumerate(df.columns):
-                        column_width = max(df[col].astype(str).map(len).max(), len(col)) + 2
-                        worksheet.set_column(i, i, column_width)
-
-                print(f"Extraction and summarization complete. Saved in '{excel_file_path}'")
-                break
-            except PermissionError:
-                input(f"The file '{excel_file_path}' is open. Please close it and press Enter to try again.")
-
-        # Sleep for 6 seconds before processing the next batch
-        time.sleep(6)
-
-        # Increment the batch number
-        batch_number += 1
-
-    except FileNotFoundError:
-        print(f"No more files found for batch {batch_number}.")
-        break
-
-# Save the combined data to a final Excel file
-df_all = pd.DataFrame(all_responses)
-df_all.fillna("N/A", inplace=True)
-combined_excel_file_path = os.path.join(output_folder, "combined_bug_details.xlsx")
-with pd.ExcelWriter(combined_excel_file_path, engine='xlsxwriter') as writer:
-    df_all.to_excel(writer, index=False, sheet_name='Bug Details')
-
-    # Access the XlsxWriter workbook and worksheet objects
-    workbook = writer.book
-    worksheet = writer.sheets['Bug Details']
-
-    # Set the column widths
-    for i, col in enumerate(df_all.columns):
-        column_width = max(df_all[col].astype(str).map(len).max(), len(col)) + 2
-        worksheet.set_column(i, i, column_width)
-
-print(f"Final combined extraction and summarization complete. Saved in '{combined_excel_file_path}'")
+# Build the chat-completions request for one bug
+def build_request(bug_data):
+    return {
+        'model': MODEL,
+        'messages': [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": bug_data},
+        ],
+        **REQUEST_PARAMS,
+    }
+
+# Load the scraped batch files in order until one is missing, or read the record store if one is given.
+# The store holds GNU and Debian bugs under their own tracker names; both are summarized here.
+def iter_scraped_batches(store_path=None):
+    if store_path:
+        return iter_store_batches(store_path, DEBBUGS_TRACKERS)
+    return iter_batch_files("scraped_gnu_data_batch_{}.txt", parse_scraped_data)
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize scraped GNU/Debian batches with GPT")
+    parser.add_argument('--store', help="Read scraped bugs from this record store instead of the batch .txt files")
+    add_scheduler_arguments(parser)
+    add_compaction_arguments(parser)
+    add_packing_arguments(parser)
+    add_export_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    start_metrics(args)
+    asyncio.run(summarize_batches(args, iter_scraped_batches(args.store), build_request))
+    finish_metrics(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import glob
+import re
+import sqlite3
+import time
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+# Durable per-URL scrape status shared by both scrapers
+class ProgressLedger:
+    def __init__(self, path="scrape_progress.sqlite"):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS progress ("
+            "url TEXT PRIMARY KEY, status TEXT, reason TEXT, attempts INTEGER DEFAULT 0, updated_at REAL)"
+        )
+        self.conn.commit()
+
+    # Register the URLs of a run and return the ones still to scrape
+    def plan(self, urls, resume=False, retry_failed=False):
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO progress (url, status, updated_at) VALUES (?, ?, ?)",
+            ((url, PENDING, now) for url in urls),
+        )
+        self.conn.commit()
+        if not resume and not retry_failed:
+            return list(urls)
+        statuses = dict(self.conn.execute("SELECT url, status FROM progress"))
+        if retry_failed:
+            return [url for url in urls if statuses.get(url) == FAILED]
+        return [url for url in urls if statuses.get(url) != DONE]
+
+    def mark_done(self, urls):
+        self.conn.executemany(
+            "UPDATE progress SET status = ?, reason = NULL, attempts = attempts + 1, updated_at = ? WHERE url = ?",
+            ((DONE, time.time(), url) for url in urls),
+        )
+        self.conn.commit()
+
+    def mark_failed(self, url, reason):
+        self.conn.execute(
+            "UPDATE progress SET status = ?, reason = ?, attempts = attempts + 1, updated_at = ? WHERE url = ?",
+            (FAILED, str(reason)[:1000], time.time(), url),
+        )
+        self.conn.commit()
+
+    def failures(self):
+        return self.conn.execute("SELECT url, reason, attempts FROM progress WHERE status = ?", (FAILED,)).fetchall()
+
+    def summary(self):
+        counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM progress GROUP BY status"))
+        return f"Done: {counts.get(DONE, 0)}, failed: {counts.get(FAILED, 0)}, pending: {counts.get(PENDING, 0)}"
+
+    def close(self):
+        self.conn.close()
+
+# First batch number not already used by a batch file, so resumed runs never overwrite earlier output
+def next_batch_number(pattern):
+    numbers = [int(match.group(1)) for path in glob.glob(pattern.replace('{}', '*'))
+               if (match := re.search(r'_(\d+)\.txt$', path))]
+    return max(numbers, default=0) + 1
+
+# Command-line options shared by both scrapers
+def add_ledger_arguments(parser):
+    parser.add_argument('--ledger', default="scrape_progress.sqlite", help="Per-URL progress ledger")
+    parser.add_argument('--resume', action='store_true', help="Skip URLs already scraped in an earlier run")
+    parser.add_argument('--retry-failed', action='store_true', help="Only scrape URLs that failed in an earlier run")
@@ -0,0 +1,172 @@
+import asyncio
+import random
+import time
+import openai
+from tqdm import tqdm
+from compaction import count_tokens
+from metrics import metrics
+from responsecache import CacheMissError, ResponseCache
+
+# Errors worth retrying; anything else (e.g. InvalidRequestError) fails the request straight away
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.APIError,
+    openai.error.Timeout,
+    openai.error.APIConnectionError,
+    openai.error.ServiceUnavailableError,
+    openai.error.TryAgain,
+)
+
+# Prompt size counted locally, plus per-message overhead
+def estimate_tokens(messages, max_tokens=0):
+    return sum(count_tokens(message['content']) + 4 for message in messages) + max_tokens
+
+# URL of the bug a request is for, from the first line of the bug text
+def request_url(request):
+    first_line = request['messages'][-1]['content'].split('\n', 1)[0]
+    return first_line.split(': ', 1)[1].strip() if first_line.startswith(('LINK: ', 'Main URL: ')) else None
+
+# Token bucket refilled continuously up to a per-minute budget
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, amount):
+        amount = min(amount, self.capacity)  # A single oversized request must still get through
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+# Concurrent chat-completions scheduler with RPM/TPM limits and retries with backoff
+class LLMScheduler:
+    def __init__(self, concurrency=8, rpm=500, tpm=200000, max_retries=6, base_delay=1.0, max_delay=60.0, create=None,
+                 cache=None, offline=False):
+        self.concurrency = concurrency
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.create = create or openai.ChatCompletion.acreate
+        self.cache = cache
+        self.offline = offline  # Only serve cached responses, never call the API
+        self.semaphore = None
+        self.request_bucket = None
+        self.token_bucket = None
+        self.stats = {'requests': 0, 'retries': 0, 'failures': 0}
+
+    # Limits are created lazily so they belong to the running event loop
+    def _limits(self):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+            self.request_bucket = TokenBucket(self.rpm)
+            self.token_bucket = TokenBucket(self.tpm)
+
+    # Exponential backoff with full jitter
+    def backoff(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def complete(self, **request):
+        if self.cache is not None:
+            key = self.cache.key(request)
+            cached = self.cache.get(key)
+            if cached is not None:
+                metrics.count('cache_hits')
+                return {
+                    'choices': [{'message': {'role': 'assistant', 'content': cached['response_text']}}],
+                    'usage': {'prompt_tokens': cached['prompt_tokens'], 'completion_tokens': cached['completion_tokens']},
+                    'cached': True,
+                }
+        if self.offline:
+            raise CacheMissError("Response not in cache")
+
+        response = await self._request(request)
+        usage = response.get('usage') or {}
+        metrics.count('prompt_tokens', usage.get('prompt_tokens', 0))
+        metrics.count('completion_tokens', usage.get('completion_tokens', 0))
+        if self.cache is not None:
+            self.cache.put(key, request.get('model'), response['choices'][0]['message']['content'],
+                           usage.get('prompt_tokens', 0), usage.get('completion_tokens', 0))
+        return response
+
+    async def _request(self, request):
+        self._limits()
+        estimated = estimate_tokens(request['messages'], request.get('max_tokens', 0))
+        url = request_url(request)
+        for attempt in range(self.max_retries + 1):
+            await self.request_bucket.acquire(1)
+            await self.token_bucket.acquire(estimated)
+            async with self.semaphore:
+                try:
+                    self.stats['requests'] += 1
+                    with metrics.span('llm_call', url, attempt=attempt):
+                        return await self.create(**request)
+                except RETRYABLE_ERRORS as e:
+                    if isinstance(e, openai.error.RateLimitError):
+                        metrics.count('rate_limited')
+                    if attempt == self.max_retries:
+                        self.stats['failures'] += 1
+                        metrics.count('llm_failures')
+                        raise
+                    self.stats['retries'] += 1
+                    metrics.count('retries')
+                except Exception:
+                    # Not worth retrying (bad request, missing key, ...), but still a failed request
+                    self.stats['failures'] += 1
+                    metrics.count('llm_failures')
+                    raise
+            await asyncio.sleep(self.backoff(attempt))
+
+    def report(self):
+        report = f"Requests: {self.stats['requests']}, retries: {self.stats['retries']}, failures: {self.stats['failures']}"
+        if self.cache is not None:
+            report += f"\n{self.cache.report()}"
+        return report
+
+# Summarize every bug concurrently, keeping the input order and skipping bugs that fail
+async def summarize_all(scheduler, bugs_data, urls, build_request, extract_bug_details, desc="Processing"):
+    progress = tqdm(total=len(bugs_data), desc=desc)
+
+    async def summarize(bug_data, url):
+        try:
+            response = await scheduler.complete(**build_request(bug_data))
+        except (openai.error.OpenAIError, CacheMissError) as e:
+            print(f"Error processing {url}: {e}")
+            return None
+        finally:
+            progress.update(1)
+        return extract_bug_details(response['choices'][0]['message']['content'], url)
+
+    results = await asyncio.gather(*(summarize(bug_data, url) for bug_data, url in zip(bugs_data, urls)))
+    progress.close()
+    return [result for result in results if result is not None]
+
+# Command-line options shared by both summarizers
+def add_scheduler_arguments(parser):
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent requests in flight")
+    parser.add_argument('--rpm', type=int, default=500, help="Requests per minute limit")
+    parser.add_argument('--tpm', type=int, default=200000, help="Tokens per minute limit")
+    parser.add_argument('--max-retries', type=int, default=6, help="Retries per request before the bug is skipped")
+    parser.add_argument('--cache', default="response_cache.sqlite", help="Response cache database")
+    parser.add_argument('--no-cache', action='store_true', help="Always call the API")
+    parser.add_argument('--offline', action='store_true', help="Re-extract from cached responses only, skipping uncached bugs")
+    parser.add_argument('--cache-max-age-days', type=float, help="Evict cached responses older than this")
+    parser.add_argument('--cache-max-mb', type=float, help="Evict least recently used responses above this size")
+
+def scheduler_from_args(args):
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(args.cache, args.cache_max_age_days, args.cache_max_mb)
+        cache.evict()
+    return LLMScheduler(concurrency=args.concurrency, rpm=args.rpm, tpm=args.tpm, max_retries=args.max_retries,
+                        cache=cache, offline=args.offline)
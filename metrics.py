@@ -0,0 +1,117 @@
+import json
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Per-stage timings (goto, wait_selectors, extract, http_fetch, bulk_fetch, llm_call), event counters and
+# token counts for one run, optionally traced to JSON lines as they happen
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = defaultdict(list)
+        self.counters = Counter()
+        self.trace_file = None
+        self.started = time.time()
+
+    def open_trace(self, path):
+        self.trace_file = open(path, 'w', encoding='utf-8')
+
+    def _trace(self, entry):
+        if self.trace_file is not None:
+            self.trace_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self.trace_file.flush()
+
+    def record(self, stage, seconds, url=None, **fields):
+        with self.lock:
+            self.timings[stage].append(seconds)
+            self._trace({'ts': round(time.time(), 3), 'stage': stage, 'url': url, 'seconds': round(seconds, 6), **fields})
+
+    def count(self, event, amount=1):
+        with self.lock:
+            self.counters[event] += amount
+
+    # Time a block; failures are recorded with the error type and counted, timeouts separately
+    @contextmanager
+    def span(self, stage, url=None, **fields):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            error = type(e).__name__
+            self.count(f"{stage}_errors")
+            if 'Timeout' in error:
+                self.count('timeouts')
+            self.record(stage, time.perf_counter() - start, url, error=error, **fields)
+            raise
+        self.record(stage, time.perf_counter() - start, url, **fields)
+
+    def stage_summary(self, stage):
+        values = sorted(self.timings[stage])
+        quantiles = {q: values[min(len(values) - 1, int(q * (len(values) - 1) + 0.5))] for q in QUANTILES}
+        return len(values), sum(values), quantiles
+
+    def summary(self):
+        if not self.timings and not self.counters:
+            return "No metrics recorded"
+        lines = [f"Run metrics ({time.time() - self.started:.1f}s):"]
+        for stage in sorted(self.timings):
+            count, total, quantiles = self.stage_summary(stage)
+            lines.append(f"  {stage:<15} n={count:<6} total={total:8.2f}s mean={total / count * 1000:8.1f}ms "
+                         + " ".join(f"p{int(q * 100)}={quantiles[q] * 1000:.1f}ms" for q in QUANTILES))
+        if self.counters:
+            lines.append("  " + ", ".join(f"{event}: {value}" for event, value in sorted(self.counters.items())))
+        return "\n".join(lines)
+
+    def prometheus(self):
+        lines = ["# HELP bugscraper_stage_seconds Time spent per URL in each stage",
+                 "# TYPE bugscraper_stage_seconds summary"]
+        for stage in sorted(self.timings):
+            count, total, quantiles = self.stage_summary(stage)
+            for q in QUANTILES:
+                lines.append(f'bugscraper_stage_seconds{{stage="{stage}",quantile="{q}"}} {quantiles[q]:.6f}')
+            lines.append(f'bugscraper_stage_seconds_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'bugscraper_stage_seconds_count{{stage="{stage}"}} {count}')
+        tokens = {event: value for event, value in self.counters.items() if event.endswith('_tokens')}
+        events = {event: value for event, value in self.counters.items() if event not in tokens}
+        lines += ["# HELP bugscraper_tokens_total LLM tokens by kind", "# TYPE bugscraper_tokens_total counter"]
+        lines += [f'bugscraper_tokens_total{{kind="{event[:-len("_tokens")]}"}} {value}' for event, value in sorted(tokens.items())]
+        lines += ["# HELP bugscraper_events_total Retries, rate limits, timeouts, failures and parse results",
+                  "# TYPE bugscraper_events_total counter"]
+        lines += [f'bugscraper_events_total{{event="{event}"}} {value}' for event, value in sorted(events.items())]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(self.prometheus())
+
+    def close(self):
+        if self.trace_file is not None:
+            stages = {}
+            for stage in self.timings:
+                count, total, quantiles = self.stage_summary(stage)
+                stages[stage] = {'count': count, 'seconds': round(total, 6), 'p95': round(quantiles[0.95], 6)}
+            self._trace({'ts': round(time.time(), 3), 'stage': 'run_summary', 'counters': dict(self.counters), 'stages': stages})
+            self.trace_file.close()
+            self.trace_file = None
+
+# Shared by every module in the process, the same way scrape_errors is
+metrics = Metrics()
+
+# Command-line options shared by the scrapers, the summarizers and the pipeline
+def add_metrics_arguments(parser):
+    parser.add_argument('--metrics-file', help="Write Prometheus text metrics to this file at the end of the run")
+    parser.add_argument('--trace', help="Write a JSON-lines trace of every timed stage to this file")
+
+def start_metrics(args):
+    if args.trace:
+        metrics.open_trace(args.trace)
+
+def finish_metrics(args):
+    print(metrics.summary())
+    if args.metrics_file:
+        metrics.write_prometheus(args.metrics_file)
+        print(f"Metrics written to '{args.metrics_file}'")
+    metrics.close()
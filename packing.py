@@ -0,0 +1,123 @@
+import asyncio
+import openai
+from tqdm import tqdm
+from compaction import count_tokens
+from extraction import JSON, PARTIAL, SECTIONS, load_json_object, sections_from_json
+from metrics import metrics
+from responsecache import CacheMissError
+
+PACK_SEPARATOR = "\n\n" + "#" * 40 + "\n\n"
+PACK_PROMPT = (
+    "You will receive several bug reports separated by lines of '#' characters. Each report starts with its URL "
+    "(after 'LINK:' or 'Main URL:'). Summarize every report on its own. Reply with a JSON object of the form "
+    '{"bugs": [...]} holding one object per report, with the keys "url" (copied exactly from the report), '
+    + ", ".join(f'"{section}"' for section in SECTIONS) + ". Every value is a string."
+)
+MAX_OUTPUT_TOKENS = 16384
+
+# Group consecutive bugs into packs that fit the token budget
+def pack_bugs(bugs_data, urls, budget, max_bugs):
+    packs = []
+    current, current_tokens = [], 0
+    for bug_data, url in zip(bugs_data, urls):
+        tokens = count_tokens(bug_data)
+        if current and (current_tokens + tokens > budget or len(current) == max_bugs):
+            packs.append(current)
+            current, current_tokens = [], 0
+        current.append((bug_data, url))
+        current_tokens += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+# Reuse the summarizer's single-bug request, swapping in the packing prompt and room for every answer
+def build_packed_request(build_request, bugs_data):
+    request = build_request(PACK_SEPARATOR.join(bugs_data))
+    request['messages'][0] = {"role": "system", "content": PACK_PROMPT}
+    request['max_tokens'] = min(MAX_OUTPUT_TOKENS, request.get('max_tokens', 2048) * len(bugs_data))
+    request['response_format'] = {'type': 'json_object'}
+    return request
+
+# Rows for the URLs that came back complete; anything missing or malformed is left out
+def parse_packed_response(response_text, urls):
+    data = load_json_object(response_text)
+    if data is None:
+        return {}
+    items = data.get('bugs')
+    if items is None:
+        # Also accept an object keyed by URL
+        items = [dict(value, url=url) for url, value in data.items() if isinstance(value, dict)]
+    if not isinstance(items, list):
+        return {}
+
+    wanted = set(urls)
+    rows = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        url = str(item.get('url') or item.get('URL') or '').strip()
+        found = sections_from_json(item)
+        if url not in wanted or "Bug Description" not in found:
+            continue
+        rows[url] = {"URL": url, **{section: found.get(section, "N/A") for section in SECTIONS},
+                     "Parse Status": JSON if len(found) == len(SECTIONS) else PARTIAL}
+        metrics.count(f"parse_{rows[url]['Parse Status']}")
+    return rows
+
+# Summarizes several small bugs per request, falling back to one request per bug for any bug the reply misses
+class BugPacker:
+    def __init__(self, budget=6000, max_bugs=10):
+        self.budget = budget
+        self.max_bugs = max_bugs
+        self.stats = {'bugs': 0, 'packed_requests': 0, 'packed_bugs': 0, 'fallbacks': 0}
+
+    async def summarize(self, scheduler, bugs_data, urls, build_request, extract_bug_details, desc="Processing"):
+        progress = tqdm(total=len(bugs_data), desc=desc)
+
+        async def summarize_one(bug_data, url):
+            try:
+                response = await scheduler.complete(**build_request(bug_data))
+            except (openai.error.OpenAIError, CacheMissError) as e:
+                print(f"Error processing {url}: {e}")
+                return None
+            finally:
+                progress.update(1)
+            return extract_bug_details(response['choices'][0]['message']['content'], url)
+
+        async def summarize_pack(pack):
+            if len(pack) == 1:
+                return [await summarize_one(*pack[0])]
+            pack_urls = [url for _, url in pack]
+            self.stats['packed_requests'] += 1
+            try:
+                response = await scheduler.complete(**build_packed_request(build_request, [bug_data for bug_data, _ in pack]))
+                rows = parse_packed_response(response['choices'][0]['message']['content'], pack_urls)
+            except (openai.error.OpenAIError, CacheMissError) as e:
+                print(f"Error processing pack of {len(pack)} bugs, retrying them one by one: {e}")
+                rows = {}
+            self.stats['packed_bugs'] += len(rows)
+            self.stats['fallbacks'] += len(pack) - len(rows)
+            progress.update(len(rows))
+            missing = [(bug_data, url) for bug_data, url in pack if url not in rows]
+            retried = await asyncio.gather(*(summarize_one(bug_data, url) for bug_data, url in missing))
+            rows.update((url, row) for (_, url), row in zip(missing, retried))
+            return [rows[url] for url in pack_urls]
+
+        self.stats['bugs'] += len(bugs_data)
+        results = await asyncio.gather(*(summarize_pack(pack) for pack in pack_bugs(bugs_data, urls, self.budget, self.max_bugs)))
+        progress.close()
+        return [row for rows in results for row in rows if row is not None]
+
+    def report(self):
+        requests = self.stats['packed_requests'] + self.stats['bugs'] - self.stats['packed_bugs']
+        return (f"Packing: {self.stats['bugs']} bugs in {requests} requests, {self.stats['packed_bugs']} bugs answered in "
+                f"{self.stats['packed_requests']} packed requests, {self.stats['fallbacks']} fell back to single requests")
+
+# Command-line options shared by both summarizers
+def add_packing_arguments(parser):
+    parser.add_argument('--pack', action='store_true', help="Summarize several small bugs per request")
+    parser.add_argument('--pack-budget', type=int, default=6000, help="Max prompt tokens of bug text per packed request")
+    parser.add_argument('--pack-max-bugs', type=int, default=10, help="Max bugs per packed request")
+
+def packer_from_args(args):
+    return BugPacker(budget=args.pack_budget, max_bugs=args.pack_max_bugs) if args.pack else None
@@ -0,0 +1,151 @@
+import argparse
+import difflib
+import glob
+import json
+import os
+import sys
+from http.server import BaseHTTPRequestHandler
+from playwright.sync_api import Error
+from benchmark import start_server
+from gnuscraper import GnuScraperSession, fetch_gnu_record, format_gnu_record, make_http_session, scrape_gnu_data, scrape_gnu_page
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(HERE, 'fixtures', 'debbugs')
+FIELDS = ['bug_description', 'pkginfo', 'buginfo', 'first_message']
+
+def read_fixture(path):
+    with open(path, 'rb') as file:
+        return file.read()
+
+# Browser output recorded next to each fixture, so the check also runs where Chromium is not installed
+def recorded_path(path):
+    return os.path.splitext(path)[0] + '.browser.json'
+
+# Serves each fixture byte for byte at /<name>.html, and at /scripted/<name>.html as a page that only
+# exists once its script has run, so the HTTP backend has to fall back to the browser for it
+class FixtureHandler(BaseHTTPRequestHandler):
+    fixture_dir = FIXTURE_DIR
+
+    def do_GET(self):
+        name = os.path.basename(self.path)
+        path = os.path.join(self.fixture_dir, name)
+        if not name.endswith('.html') or not os.path.exists(path):
+            self.send_error(404)
+            return
+        body = read_fixture(path)
+        if self.path.startswith('/scripted/'):
+            script = json.dumps(body.decode('utf-8')).replace('</', '<\\/')
+            body = f"<html><body><script>document.open();document.write({script});document.close();</script></body></html>".encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+# Scrape every served fixture through scrape_gnu_page, as the browser backend does; None if Chromium is missing
+def browser_records(session, base_url, paths):
+    try:
+        session.start()
+    except Error as e:
+        print(f"Chromium is not available ({str(e).splitlines()[0]}), using the recorded browser output")
+        return None
+    return {path: scrape_gnu_page(session, f"{base_url}/{os.path.basename(path)}") for path in paths}
+
+def load_recorded(path):
+    if not os.path.exists(recorded_path(path)):
+        return None
+    with open(recorded_path(path), 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+def show_diff(expected, actual, label):
+    diff = difflib.unified_diff(str(expected).split('\n'), str(actual).split('\n'), 'browser', label, lineterm='', n=1)
+    for line in diff:
+        print(f"    {line!r}")
+
+# Field-by-field comparison of the HTTP backend against the browser; returns the number of mismatched fields
+def compare(path, expected, actual):
+    mismatches = 0
+    for field in FIELDS:
+        if expected.get(field) == actual.get(field):
+            continue
+        mismatches += 1
+        print(f"{os.path.basename(path)}: {field} differs")
+        show_diff(expected.get(field), actual.get(field), 'http')
+    return mismatches
+
+# Run the fixtures through scrape_gnu_data with the HTTP backend, and the scripted copies through its browser
+# fallback; every formatted entry must match what the browser produced for the static page
+def check_batches(session, http, base_url, expected):
+    mismatches = 0
+    paths = list(expected)
+    runs = [('http', [f"{base_url}/{os.path.basename(path)}" for path in paths])]
+    if session.browser is not None:
+        runs.append(('fallback', [f"{base_url}/scripted/{os.path.basename(path)}" for path in paths]))
+    for label, urls in runs:
+        entries = scrape_gnu_data(urls, 0, len(urls), session=session, backend='http', http=http, workers=2)
+        for path, url, entry in zip(paths, urls, entries):
+            wanted = format_gnu_record(url, expected[path])
+            if entry != wanted:
+                mismatches += 1
+                print(f"{os.path.basename(path)}: scrape_gnu_data ({label}) output differs")
+                show_diff(wanted, entry, label)
+    if session.browser is None:
+        print("Skipped the browser fallback through scrape_gnu_data, it needs Chromium")
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the HTTP debbugs backend matches the browser on saved pages")
+    parser.add_argument('--fixtures', default=FIXTURE_DIR, help="Directory of saved debbugs/Debian .html pages")
+    parser.add_argument('--record', action='store_true', help="Save the browser output next to each page")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.fixtures, '*.html')))
+    if not paths:
+        sys.exit(f"No .html pages in '{args.fixtures}'")
+    server, base_url = start_server(FixtureHandler, fixture_dir=args.fixtures)
+    http = make_http_session(2)
+
+    with GnuScraperSession() as session:
+        live = browser_records(session, base_url, paths)
+        if args.record:
+            if live is None:
+                sys.exit("--record needs Chromium (python -m playwright install chromium)")
+            for path, record in live.items():
+                with open(recorded_path(path), 'w', encoding='utf-8') as file:
+                    json.dump(record, file, indent=2, ensure_ascii=False)
+            print(f"Recorded browser output for {len(live)} pages")
+
+        expected = {}
+        mismatches = 0
+        for path in paths:
+            record = live[path] if live is not None else load_recorded(path)
+            if record is None:
+                print(f"{os.path.basename(path)}: no browser output to compare against, skipping")
+                continue
+            expected[path] = record
+            mismatches += compare(path, record, fetch_gnu_record(http, f"{base_url}/{os.path.basename(path)}"))
+
+        # The scripted copies have no heading in their static HTML, so fetch_gnu_record must hand them to the browser
+        for path in paths:
+            try:
+                fetch_gnu_record(http, f"{base_url}/scripted/{os.path.basename(path)}")
+            except ValueError:
+                continue
+            mismatches += 1
+            print(f"{os.path.basename(path)}: the scripted copy was parsed over HTTP instead of falling back to the browser")
+
+        if expected:
+            mismatches += check_batches(session, http, base_url, expected)
+    server.shutdown()
+
+    print(f"Checked {len(expected)} of {len(paths)} pages, {mismatches} mismatches")
+    if not expected:
+        sys.exit(2)
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
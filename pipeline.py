@@ -0,0 +1,154 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import openai
+from tqdm import tqdm
+from compaction import add_compaction_arguments, compactor_from_args
+from export import RowWriter, add_export_arguments
+from llmscheduler import add_scheduler_arguments, scheduler_from_args
+from metrics import add_metrics_arguments, finish_metrics, start_metrics
+from recordstore import RecordStore
+from responsecache import CacheMissError
+from trackers import ADAPTERS, EngineContext, adapter_for, get_adapter, read_links
+
+_DONE = object()
+
+# JSONL result log written one flushed line at a time, so a crash loses at most the line being written
+class JsonlLog:
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def append(self, entry):
+        self.file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+# Feed the links to a fixed number of workers so only `workers` scrapes are ever in flight
+async def run_workers(items, workers, handle):
+    iterator = iter(items)
+
+    async def worker():
+        for item in iterator:
+            await handle(item)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+# Pair every link with the adapter that handles it; with --tracker auto each link is routed by its URL
+def plan_links(links, tracker):
+    if tracker != 'auto':
+        adapter = get_adapter(tracker)
+        return [(link, adapter) for link in links]
+    planned = []
+    counts = {}
+    for link in links:
+        adapter = adapter_for(link)
+        if adapter is None:
+            print(f"No tracker adapter matches {link}, skipping it")
+            continue
+        planned.append((link, adapter))
+        counts[adapter.name] = counts.get(adapter.name, 0) + 1
+    print("Routed " + ", ".join(f"{count} {name}" for name, count in counts.items()))
+    return planned
+
+async def run(args):
+    links = plan_links(read_links(args.input), args.tracker)
+    scheduler = scheduler_from_args(args)
+    compactor = compactor_from_args(args)
+    context = EngineContext(args.scrape_concurrency, args.per_host)
+
+    # Bounded queue: scraping pauses whenever the summarizer falls behind
+    queue = asyncio.Queue(maxsize=args.queue_size)
+    store = RecordStore(args.store)
+    result_log = JsonlLog(args.result_log)
+    # Summaries are exported in the order they complete, straight to disk
+    output_folder = "excel_files"
+    os.makedirs(output_folder, exist_ok=True)
+    combined = RowWriter(os.path.join(output_folder, "combined_bug_details"), args.export)
+    progress = tqdm(total=len(links), desc="Summarized", unit="bug")
+    start_time = time.time()
+    first_result_time = None
+
+    # Every scraped record goes into the store before it is queued, so nothing scraped is ever lost
+    async def scrape(item):
+        url, adapter = item
+        try:
+            fields = await adapter.fetch(context, url)
+        except Exception as e:
+            print(f"Error scraping {url}: {e}")
+            progress.update(1)
+            return
+        record = adapter.make_record(url, fields)
+        store.append(record)
+        await queue.put((url, adapter, record))
+
+    # One pool of scrape workers for every tracker, so a mixed sheet shares one concurrency limit
+    async def producer():
+        try:
+            await run_workers(links, args.scrape_concurrency, scrape)
+        finally:
+            for _ in range(args.concurrency):
+                await queue.put(_DONE)
+
+    async def consumer():
+        nonlocal first_result_time
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                return
+            url, adapter, record = item
+            try:
+                response = await scheduler.complete(**adapter.build_request(compactor.compact_record(record)))
+            except (openai.error.OpenAIError, CacheMissError) as e:
+                print(f"Error processing {url}: {e}")
+                continue
+            finally:
+                progress.update(1)
+            details = adapter.extract(response['choices'][0]['message']['content'], url)
+            result_log.append(details)
+            combined.write(details)
+            if first_result_time is None:
+                first_result_time = time.time() - start_time
+
+    try:
+        await asyncio.gather(producer(), *(consumer() for _ in range(args.concurrency)))
+    finally:
+        progress.close()
+        store.close()
+        result_log.close()
+        combined.close()
+        await context.close()
+
+    print(f"Final combined extraction and summarization complete. Saved in {', '.join(repr(path) for path in combined.paths)}")
+    if first_result_time is not None:
+        print(f"First summary after {first_result_time:.2f} seconds")
+    print(f"Total time taken: {time.time() - start_time:.2f} seconds")
+    print(scheduler.report())
+    print(compactor.report())
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape and summarize in one pipelined run")
+    parser.add_argument('--tracker', choices=['auto'] + [adapter.name for adapter in ADAPTERS], default='auto',
+                        help="Tracker of every link, or auto to route each link by its URL")
+    parser.add_argument('--input', default=None, help="Excel file with a LINK column")
+    parser.add_argument('--scrape-concurrency', type=int, default=8, help="Pages or HTTP fetches in flight")
+    parser.add_argument('--per-host', type=int, default=4, help="Max concurrent fetches per host")
+    parser.add_argument('--queue-size', type=int, default=100, help="Scraped records waiting for the summarizer")
+    parser.add_argument('--store', default="record_store", help="Record store that keeps every scraped record")
+    parser.add_argument('--result-log', default="summarized_records.jsonl", help="Durable log of every summary")
+    add_scheduler_arguments(parser)
+    add_compaction_arguments(parser)
+    add_export_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    if args.input is None:
+        args.input = 'GNUmini.xlsx' if args.tracker in ('gnu', 'debian') else 'bugsmini.xlsx'
+    start_metrics(args)
+    asyncio.run(run(args))
+    finish_metrics(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sqlite3
+import time
+from urllib.parse import urlparse, parse_qs
+import pandas as pd
+
+# Fields stored for each tracker, in the order the scrapers produce them
+RECORD_FIELDS = {
+    'bugzilla': ['short_desc', 'bug_column', 'comments'],
+    'gnu': ['bug_description', 'pkginfo', 'buginfo', 'first_message'],
+    'debian': ['bug_description', 'pkginfo', 'buginfo', 'first_message'],
+}
+COLUMNS = ['url', 'bug_id', 'tracker', 'scraped_at'] + list(dict.fromkeys(
+    field for fields in RECORD_FIELDS.values() for field in fields))
+DEBBUGS_TRACKERS = ('gnu', 'debian')
+DEBIAN_HOSTS = ('bugs.debian.org',)
+
+# debbugs records are stored under the tracker that serves them, whichever scraper or adapter fetched them
+def debbugs_tracker(url):
+    host = urlparse(str(url)).hostname or ''
+    return 'debian' if any(host == known or host.endswith('.' + known) for known in DEBIAN_HOSTS) else 'gnu'
+
+# Bug ID from a show_bug.cgi?id=, bugreport.cgi?bug= or bugs.debian.org/NNN link
+def bug_id_from_url(url):
+    parsed = urlparse(str(url))
+    query = parse_qs(parsed.query)
+    for name in ('id', 'bug'):
+        if query.get(name) and query[name][0].isdigit():
+            return query[name][0]
+    match = re.search(r'/(\d+)/?$', parsed.path)
+    return match.group(1) if match else None
+
+# Typed record with every column present, so JSONL and Parquet share one schema
+def make_record(tracker, url, fields, scraped_at=None):
+    record = {column: None for column in COLUMNS}
+    record.update({
+        'url': url,
+        'bug_id': bug_id_from_url(url),
+        'tracker': tracker,
+        'scraped_at': scraped_at if scraped_at is not None else time.time(),
+    })
+    for field in RECORD_FIELDS[tracker]:
+        record[field] = fields.get(field)
+    return record
+
+# The exact text parse_scraped_data yields for this record in a batch file, so prompts and cache keys match
+def record_text(record):
+    fields = {field: record[field] for field in RECORD_FIELDS[record['tracker']]}
+    if record['tracker'] in DEBBUGS_TRACKERS:
+        from gnuscraper import format_gnu_record
+        return (format_gnu_record(record['url'], fields) + '\n' + ('=' * 80)).strip()
+    from bugzillascraper import format_bug_record
+    return (format_bug_record(record['url'], fields) + "-" * 80).strip()
+
+# Append-only JSONL shards with a SQLite index for O(1) lookups and Parquet compaction for columnar reads
+class RecordStore:
+    def __init__(self, directory, shard_size=10000):
+        self.directory = directory
+        self.shard_size = shard_size
+        os.makedirs(directory, exist_ok=True)
+        self.index = sqlite3.connect(os.path.join(directory, 'index.sqlite'))
+        self.index.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "url TEXT PRIMARY KEY, bug_id TEXT, tracker TEXT, shard TEXT, offset INTEGER, length INTEGER)"
+        )
+        self.index.execute("CREATE INDEX IF NOT EXISTS records_bug_id ON records (bug_id)")
+        self.index.commit()
+        self.shard_file = None
+        self.shard_lines = 0
+        self.pending = 0
+
+    def _shards(self):
+        return sorted(glob.glob(os.path.join(self.directory, 'records-*.jsonl')))
+
+    # Open the newest shard, starting a new one once it is full
+    def _open_shard(self):
+        shards = self._shards()
+        if shards:
+            with open(shards[-1], 'rb') as file:
+                lines = sum(1 for _ in file)
+            if lines < self.shard_size:
+                self.shard_lines = lines
+                return open(shards[-1], 'ab')
+        self.shard_lines = 0
+        return open(os.path.join(self.directory, f"records-{len(shards) + 1:05d}.jsonl"), 'ab')
+
+    # Append a record; a later record for the same URL replaces the earlier one in the index
+    def append(self, record):
+        if self.shard_file is None or self.shard_lines >= self.shard_size:
+            if self.shard_file:
+                self.shard_file.close()
+            self.shard_file = self._open_shard()
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        offset = self.shard_file.tell()
+        self.shard_file.write(line)
+        self.shard_file.flush()
+        self.shard_lines += 1
+        self.index.execute(
+            "INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?)",
+            (record['url'], record['bug_id'], record['tracker'], os.path.basename(self.shard_file.name), offset, len(line)),
+        )
+        self.pending += 1
+        if self.pending >= 100:
+            self.flush()
+
+    def add(self, tracker, url, fields):
+        self.append(make_record(tracker, url, fields))
+
+    def flush(self):
+        self.index.commit()
+        self.pending = 0
+
+    def _read(self, shard, offset, length):
+        with open(os.path.join(self.directory, shard), 'rb') as file:
+            file.seek(offset)
+            return json.loads(file.read(length))
+
+    def get(self, url):
+        row = self.index.execute("SELECT shard, offset, length FROM records WHERE url = ?", (url,)).fetchone()
+        return self._read(*row) if row else None
+
+    def get_by_bug_id(self, bug_id):
+        row = self.index.execute("SELECT shard, offset, length FROM records WHERE bug_id = ?", (str(bug_id),)).fetchone()
+        return self._read(*row) if row else None
+
+    def __len__(self):
+        return self.index.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    # Latest version of every record, read shard by shard in file order; tracker is one name or a tuple of names
+    def iter_records(self, tracker=None):
+        self.flush()
+        query = "SELECT shard, offset, length FROM records"
+        params = ()
+        if tracker:
+            params = (tracker,) if isinstance(tracker, str) else tuple(tracker)
+            query += f" WHERE tracker IN ({', '.join('?' * len(params))})"
+        rows = self.index.execute(query + " ORDER BY shard, offset", params).fetchall()
+        current_shard = None
+        file = None
+        for shard, offset, length in rows:
+            if shard != current_shard:
+                if file:
+                    file.close()
+                file = open(os.path.join(self.directory, shard), 'rb')
+                current_shard = shard
+            file.seek(offset)
+            yield json.loads(file.read(length))
+        if file:
+            file.close()
+
+    def parquet_path(self):
+        return os.path.join(self.directory, 'records.parquet')
+
+    # Rewrite the latest version of every record into one Parquet file
+    def compact(self, chunk_size=10000):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(column, pa.float64() if column == 'scraped_at' else pa.string()) for column in COLUMNS])
+        tmp_path = self.parquet_path() + '.tmp'
+        writer = pq.ParquetWriter(tmp_path, schema)
+        chunk = []
+        for record in self.iter_records():
+            chunk.append(record)
+            if len(chunk) == chunk_size:
+                writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+                chunk = []
+        if chunk:
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+        writer.close()
+        os.replace(tmp_path, self.parquet_path())
+
+    # Columnar read of a few fields, compacting first if the shards have changed since the last compaction
+    def read_columns(self, *columns):
+        self.flush()
+        parquet_path = self.parquet_path()
+        shards = self._shards()
+        if not os.path.exists(parquet_path) or any(os.path.getmtime(shard) > os.path.getmtime(parquet_path) for shard in shards):
+            self.compact()
+        return pd.read_parquet(parquet_path, columns=['url'] + [column for column in columns if column != 'url'])
+
+    def close(self):
+        if self.shard_file:
+            self.shard_file.close()
+            self.shard_file = None
+        self.flush()
+        self.index.close()
+
+# Split the text of one bug from a Bugzilla batch file back into its fields
+def parse_bugzilla_text(text):
+    match = re.match(r"LINK: (.*?)\nShort Description:\n(.*?)\nBug Column:\n(.*?)\nComments:\n(.*?)\n?(?:-{80})?\s*\Z", text, re.DOTALL)
+    if not match:
+        return None, None
+    url, short_desc, bug_column, comments = match.groups()
+    return url.strip(), {'short_desc': short_desc, 'bug_column': bug_column, 'comments': comments}
+
+# Split the text of one bug from a GNU batch file back into its fields
+def parse_gnu_text(text):
+    match = re.match(r"Main URL: (.*?)\nBug Description: (.*?)\nPKGINFO:\n(.*?)\n\nBUGINFO:\n(.*?)\n\nFIRST MESSAGE:\n(.*?)\n*(?:={80})?\s*\Z", text, re.DOTALL)
+    if not match:
+        return None, None
+    url, bug_description, pkginfo, buginfo, first_message = match.groups()
+    return url.strip(), {'bug_description': bug_description, 'pkginfo': pkginfo, 'buginfo': buginfo, 'first_message': first_message}
+
+# Import existing scraped_data_batch_N.txt / scraped_gnu_data_batch_N.txt files into the store
+def convert_batch_files(store, file_paths):
+    from bugzillasummarizer import parse_scraped_data as parse_bugzilla_file
+    from gnusummarizer import parse_scraped_data as parse_gnu_file
+
+    converted = 0
+    for file_path in file_paths:
+        is_gnu = os.path.basename(file_path).startswith('scraped_gnu_data')
+        tracker, parse_file, parse_text = ('gnu', parse_gnu_file, parse_gnu_text) if is_gnu else \
+            ('bugzilla', parse_bugzilla_file, parse_bugzilla_text)
+        scraped_at = os.path.getmtime(file_path)
+        bugs_data, _ = parse_file(file_path)
+        for bug_data in bugs_data:
+            url, fields = parse_text(bug_data)
+            if url is None:
+                print(f"Skipping unparseable record in {file_path}: {bug_data[:80]!r}")
+                continue
+            store.append(make_record(debbugs_tracker(url) if is_gnu else tracker, url, fields, scraped_at))
+            converted += 1
+    store.flush()
+    return converted
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and maintain the scraped record store")
+    parser.add_argument('--store', default="record_store", help="Record store directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+    convert = commands.add_parser('convert', help="Import existing batch .txt files")
+    convert.add_argument('files', nargs='*', help="Batch files (default: every scraped_*batch_*.txt here)")
+    get = commands.add_parser('get', help="Print one record by URL or bug ID")
+    get.add_argument('key')
+    commands.add_parser('compact', help="Rewrite the store into Parquet")
+    column = commands.add_parser('column', help="Print one field for every record")
+    column.add_argument('field', choices=COLUMNS)
+    args = parser.parse_args()
+
+    store = RecordStore(args.store)
+    try:
+        if args.command == 'convert':
+            files = args.files or sorted(glob.glob('scraped_data_batch_*.txt') + glob.glob('scraped_gnu_data_batch_*.txt'))
+            print(f"Converted {convert_batch_files(store, files)} records from {len(files)} files into '{args.store}'")
+        elif args.command == 'get':
+            record = store.get(args.key) or store.get_by_bug_id(args.key)
+            print(json.dumps(record, indent=2, ensure_ascii=False) if record else f"No record for {args.key}")
+        elif args.command == 'compact':
+            store.compact()
+            print(f"Compacted {len(store)} records into '{store.parquet_path()}'")
+        elif args.command == 'column':
+            print(store.read_columns(args.field).to_string(index=False))
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import hashlib
+import json
+import sqlite3
+import time
+
+# Raised in offline mode when a request has no cached response
+class CacheMissError(Exception):
+    pass
+
+# Persistent content-addressed cache of chat-completions responses
+class ResponseCache:
+    def __init__(self, path="response_cache.sqlite", max_age_days=None, max_mb=None):
+        self.path = path
+        self.max_age_days = max_age_days
+        self.max_mb = max_mb
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response_text TEXT, "
+            "prompt_tokens INTEGER, completion_tokens INTEGER, "
+            "created_at REAL, accessed_at REAL, size INTEGER)"
+        )
+        self.conn.commit()
+        self.stats = {'hits': 0, 'misses': 0, 'tokens_saved': 0}
+
+    # Hash of model, messages (system prompt and bug data) and every other request parameter
+    @staticmethod
+    def key(request):
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        row = self.conn.execute(
+            "SELECT response_text, prompt_tokens, completion_tokens FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self.stats['misses'] += 1
+            return None
+        self.conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        self.conn.commit()
+        self.stats['hits'] += 1
+        self.stats['tokens_saved'] += (row[1] or 0) + (row[2] or 0)
+        return {'response_text': row[0], 'prompt_tokens': row[1], 'completion_tokens': row[2]}
+
+    def put(self, key, model, response_text, prompt_tokens=0, completion_tokens=0):
+        now = time.time()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, model, response_text, prompt_tokens, completion_tokens, now, now, len(response_text.encode('utf-8'))),
+        )
+        self.conn.commit()
+
+    # Every cached response, for re-parsing without any API call
+    def iter_responses(self):
+        yield from self.conn.execute("SELECT key, response_text FROM responses")
+
+    # Drop entries older than max_age_days, then the least recently used until under max_mb
+    def evict(self):
+        removed = 0
+        if self.max_age_days is not None:
+            cutoff = time.time() - self.max_age_days * 86400
+            removed += self.conn.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,)).rowcount
+        if self.max_mb is not None:
+            limit = self.max_mb * 1024 * 1024
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+                if total <= limit:
+                    break
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+                removed += 1
+        self.conn.commit()
+        return removed
+
+    def report(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        hit_rate = self.stats['hits'] / lookups * 100 if lookups else 0
+        return (f"Cache hits: {self.stats['hits']}, misses: {self.stats['misses']} ({hit_rate:.1f}% hit rate), "
+                f"tokens saved: {self.stats['tokens_saved']}")
+
+    def close(self):
+        self.conn.close()
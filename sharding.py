@@ -0,0 +1,27 @@
+import argparse
+import hashlib
+from recordstore import bug_id_from_url
+
+# Parse "i/N" into (i, N), with shards numbered 0..N-1
+def parse_shard(spec):
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Shard must look like i/N, got {spec!r}")
+    if count < 1 or not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"Shard index must be in 0..{count - 1}, got {spec!r}")
+    return index, count
+
+# Stable shard for a URL: the same bug always lands on the same shard, on any machine and any run
+def shard_of(url, count):
+    key = bug_id_from_url(url) or str(url)
+    return int(hashlib.md5(key.encode('utf-8')).hexdigest(), 16) % count
+
+def select_shard(urls, shard):
+    if shard is None:
+        return urls
+    index, count = shard
+    return [url for url in urls if shard_of(url, count) == index]
+
+def add_shard_argument(parser):
+    parser.add_argument('--shard', type=parse_shard, help="Only process shard i of N (0-based), split by bug ID hash")
@@ -0,0 +1,134 @@
+import argparse
+import heapq
+import os
+import shlex
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from export import RowWriter, add_export_arguments, read_rows
+from llmscheduler import add_scheduler_arguments
+from sharding import parse_shard
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Scraper and summarizer scripts for each tracker
+TRACKERS = {
+    'bugzilla': ('bugzillascraper.py', 'bugzillasummarizer.py'),
+    'gnu': ('gnuscraper.py', 'gnusummarizer.py'),
+}
+
+def shard_dir(output_root, index, count):
+    return os.path.join(output_root, f"shard-{index}-of-{count}")
+
+def read_links(tracker, input_path):
+    if tracker == 'bugzilla':
+        from bugzillascraper import read_bug_links
+        return read_bug_links(input_path)
+    from gnuscraper import read_urls_from_excel
+    return read_urls_from_excel(input_path)
+
+# Each shard's share of the account-wide --rpm/--tpm limits, unless the summarizer args already set them
+def shard_limit_args(summarize_args, count):
+    defaults = argparse.ArgumentParser(add_help=False)
+    add_scheduler_arguments(defaults)
+    limit_args = []
+    for option in ('--rpm', '--tpm'):
+        if not any(arg == option or arg.startswith(option + '=') for arg in summarize_args):
+            limit_args += [option, str(max(1, defaults.get_default(option[2:]) // count))]
+    return limit_args
+
+# Scrape and summarize one shard in its own directory, each step in its own process
+def run_shard(args, index, count):
+    scraper, summarizer = TRACKERS[args.tracker]
+    workdir = shard_dir(args.output_root, index, count)
+    os.makedirs(workdir, exist_ok=True)
+    log_path = os.path.join(workdir, 'shard.log')
+    summarize_args = shlex.split(args.summarize_args)
+    with open(log_path, 'a', encoding='utf-8') as log:
+        subprocess.run([sys.executable, os.path.join(HERE, scraper), '--input', os.path.abspath(args.input),
+                        '--shard', f"{index}/{count}", *shlex.split(args.scrape_args)],
+                       cwd=workdir, stdout=log, stderr=subprocess.STDOUT, check=True)
+        subprocess.run([sys.executable, os.path.join(HERE, summarizer), *summarize_args,
+                        *shard_limit_args(summarize_args, count), '--export', ",".join(args.export)],
+                       cwd=workdir, stdout=log, stderr=subprocess.STDOUT, check=True)
+    return index
+
+# A shard's combined output in the first of the export formats it was written in, or None
+def shard_output(args, index, count):
+    base_path = os.path.join(shard_dir(args.output_root, index, count), 'excel_files', 'combined_bug_details')
+    for fmt in args.export:
+        if os.path.exists(f"{base_path}.{fmt}"):
+            return f"{base_path}.{fmt}"
+    return None
+
+# A shard's rows in input order. A plain run writes them in order and they are streamed; a shard that
+# was topped up (e.g. with --retry-failed) has its late rows at the end and is sorted in memory instead.
+def ordered_rows(path, key):
+    previous = None
+    for row in read_rows(path):
+        position = key(row)
+        if previous is not None and position < previous:
+            print(f"'{path}' is not in input order, sorting it before the merge")
+            return iter(sorted(read_rows(path), key=key))
+        previous = position
+    return read_rows(path)
+
+# Stream the per-shard combined outputs back into input order, one row per shard at a time
+def merge_shards(args, count):
+    order = {url: position for position, url in enumerate(read_links(args.tracker, args.input))}
+
+    def key(row):
+        return order.get(row.get('URL'), len(order))
+
+    shards = []
+    for index in range(count):
+        path = shard_output(args, index, count)
+        if path is not None:
+            shards.append(ordered_rows(path, key))
+        else:
+            print(f"Shard {index}/{count} has no combined output yet, skipping it")
+    if not shards:
+        print("Nothing to merge")
+        return
+
+    output_folder = "excel_files"
+    os.makedirs(output_folder, exist_ok=True)
+    with RowWriter(os.path.join(output_folder, "combined_bug_details"), args.export) as combined:
+        combined.write_rows(heapq.merge(*shards, key=key))
+    print(f"Merged {len(shards)} shards ({combined.rows} bugs) into {', '.join(repr(path) for path in combined.paths)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the input workbook into shards and scrape and summarize them in parallel")
+    parser.add_argument('--tracker', choices=sorted(TRACKERS), default='bugzilla')
+    parser.add_argument('--input', default=None, help="Excel file with a LINK column")
+    parser.add_argument('--shards', type=int, default=os.cpu_count(), help="Number of shards to run on this machine")
+    parser.add_argument('--shard', type=parse_shard, help="Run only shard i of N, e.g. one shard per machine")
+    parser.add_argument('--merge-only', action='store_true', help="Only merge the shard outputs into the combined workbook")
+    parser.add_argument('--output-root', default="shards", help="Directory holding one subdirectory per shard")
+    parser.add_argument('--scrape-args', default="", help="Extra arguments for the scraper, e.g. \"--async\"")
+    parser.add_argument('--summarize-args', default="", help="Extra arguments for the summarizer")
+    add_export_arguments(parser)
+    args = parser.parse_args()
+    if args.input is None:
+        args.input = 'bugsmini.xlsx' if args.tracker == 'bugzilla' else 'GNUmini.xlsx'
+
+    if args.shard is not None:
+        # One shard of a multi-machine run; merge later with --merge-only --shards N
+        index, count = args.shard
+        run_shard(args, index, count)
+        print(f"Shard {index}/{count} done in '{shard_dir(args.output_root, index, count)}'")
+        return
+
+    count = args.shards
+    if not args.merge_only:
+        with ThreadPoolExecutor(max_workers=count) as executor:
+            futures = [executor.submit(run_shard, args, index, count) for index in range(count)]
+            for future in futures:
+                try:
+                    print(f"Shard {future.result()}/{count} done")
+                except subprocess.CalledProcessError as e:
+                    print(f"Shard failed: {e}; see shard.log in its directory")
+    merge_shards(args, count)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+from compaction import compactor_from_args
+from export import RowWriter, save_rows
+from extraction import extract_bug_details
+from llmscheduler import scheduler_from_args, summarize_all
+from packing import packer_from_args
+from recordstore import RecordStore, record_text
+
+OUTPUT_FOLDER = "excel_files"
+
+# Load the bugs from the record store in batches of the same size the scrapers write
+def iter_store_batches(store_path, tracker, batch_size=50):
+    store = RecordStore(store_path)
+    try:
+        bugs_data, urls = [], []
+        batch_number = 1
+        for record in store.iter_records(tracker):
+            bugs_data.append(record_text(record))
+            urls.append(record['url'])
+            if len(bugs_data) == batch_size:
+                yield batch_number, bugs_data, urls
+                bugs_data, urls = [], []
+                batch_number += 1
+        if bugs_data:
+            yield batch_number, bugs_data, urls
+    finally:
+        store.close()
+
+# Load the scraped batch files (e.g. "scraped_data_batch_{}.txt") in order until one is missing or empty
+def iter_batch_files(file_pattern, parse_scraped_data):
+    batch_number = 1
+    while True:
+        try:
+            # Load and parse the file
+            bugs_data, urls = parse_scraped_data(file_pattern.format(batch_number))
+        except FileNotFoundError:
+            print(f"No more files found for batch {batch_number}.")
+            return
+
+        # Check if there are no more files to process
+        if not bugs_data:
+            print("No more files to process.")
+            return
+
+        yield batch_number, bugs_data, urls
+        batch_number += 1
+
+# Save one batch of responses in every export format
+def save_batch_excel(responses, batch_number, output_folder, formats=('xlsx',)):
+    paths = save_rows(os.path.join(output_folder, f"extracted_bug_details_batch_{batch_number}"), responses, formats)
+    print(f"Extraction and summarization complete. Saved in {', '.join(repr(path) for path in paths)}")
+
+# Combined output written as each batch completes, so the whole run is never held in memory
+def open_combined(output_folder, formats=('xlsx',)):
+    return RowWriter(os.path.join(output_folder, "combined_bug_details"), formats)
+
+# Summarize every batch through the shared scheduler, saving each batch and the combined output as it goes
+async def summarize_batches(args, batches, build_request):
+    scheduler = scheduler_from_args(args)
+    compactor = compactor_from_args(args)
+    packer = packer_from_args(args)
+
+    # Create a folder for the Excel files if it doesn't exist
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+
+    # Collect responses and process the data files in batches
+    with open_combined(OUTPUT_FOLDER, args.export) as combined:
+        for batch_number, bugs_data, urls in batches:
+            # Send every bug in the batch through the shared scheduler
+            if packer is not None:
+                responses = await packer.summarize(scheduler, [compactor.compact_text(bug_data) for bug_data in bugs_data],
+                                                   urls, build_request, extract_bug_details,
+                                                   desc=f"Processing Batch {batch_number}")
+            else:
+                responses = await summarize_all(scheduler, bugs_data, urls, compactor.wrap(build_request),
+                                                extract_bug_details, desc=f"Processing Batch {batch_number}")
+            save_batch_excel(responses, batch_number, OUTPUT_FOLDER, args.export)
+            combined.write_rows(responses)
+
+    print(f"Final combined extraction and summarization complete. Saved in {', '.join(repr(path) for path in combined.paths)}")
+    print(scheduler.report())
+    print(compactor.report())
+    if packer is not None:
+        print(packer.report())
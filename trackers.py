@@ -0,0 +1,161 @@
+import asyncio
+from urllib.parse import urlparse
+import pandas as pd
+from playwright.async_api import async_playwright
+import bugzillascraper
+import bugzillasummarizer
+import gnuscraper
+import gnusummarizer
+from browserutil import WAIT_STRATEGIES, goto_and_wait_async
+from extraction import extract_bug_details
+from metrics import metrics
+from recordstore import DEBIAN_HOSTS, RECORD_FIELDS, debbugs_tracker, make_record, record_text
+
+# Adapters in match order; the first one whose matches() accepts a URL handles it
+ADAPTERS = []
+
+def register(adapter_class):
+    ADAPTERS.append(adapter_class())
+    return adapter_class
+
+def get_adapter(name):
+    for adapter in ADAPTERS:
+        if adapter.name == name:
+            return adapter
+    raise KeyError(f"Unknown tracker {name!r}, expected one of {', '.join(adapter.name for adapter in ADAPTERS)}")
+
+def adapter_for(url):
+    for adapter in ADAPTERS:
+        if adapter.matches(url):
+            return adapter
+    return None
+
+# Any sheet with a LINK column, whatever trackers it mixes
+def read_links(file_path):
+    df = pd.read_excel(file_path, usecols=['LINK'], dtype=str)
+    return [link.strip() for link in df['LINK'].dropna()]
+
+# Browser, page pool and HTTP connections shared by every adapter, with one per-host limit for both
+class EngineContext:
+    def __init__(self, concurrency=8, per_host_limit=4, stats=None, block=True):
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.stats = stats
+        self.block = block
+        self.http = gnuscraper.make_http_session(concurrency)
+        self.host_limits = {}
+        self.playwright = None
+        self.browser = None
+        self.pool = None
+        self.pool_lock = asyncio.Lock()
+
+    def host_limit(self, url):
+        host = urlparse(url).netloc
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self.host_limits[host]
+
+    # The browser only starts when an adapter first needs it, so HTTP-only runs never launch Chromium
+    async def page_pool(self):
+        async with self.pool_lock:
+            if self.pool is None:
+                self.playwright = await async_playwright().start()
+                self.browser = await self.playwright.chromium.launch(headless=True)
+                # Host limits are enforced here, so the pool itself never waits on a host
+                pool = bugzillascraper.PagePool(self.browser, self.concurrency, self.concurrency,
+                                                self.stats, self.block)
+                await pool.open()
+                self.pool = pool
+        return self.pool
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            await self.browser.close()
+            await self.playwright.stop()
+        self.http.close()
+
+# What the engine needs to know about a tracker: which URLs it owns, how to fetch and extract a bug,
+# which fields its records carry and how to prompt for and parse its summary
+class TrackerAdapter:
+    name = None
+    hosts = ()
+    summarizer = None
+
+    @property
+    def fields(self):
+        return RECORD_FIELDS[self.name]
+
+    def matches(self, url):
+        host = urlparse(str(url)).hostname or ''
+        return any(host == known or host.endswith('.' + known) for known in self.hosts)
+
+    # Return the record fields for one URL, raising on failure
+    async def fetch(self, context, url):
+        raise NotImplementedError
+
+    def make_record(self, url, fields):
+        return make_record(self.name, url, fields)
+
+    def build_request(self, record):
+        return self.summarizer.build_request(record_text(record))
+
+    def extract(self, response_text, url):
+        return extract_bug_details(response_text, url)
+
+@register
+class BugzillaAdapter(TrackerAdapter):
+    name = 'bugzilla'
+    hosts = ('bugzilla.mozilla.org', 'bugzilla.redhat.com', 'bugs.kde.org', 'bugs.gentoo.org', 'bugzilla.kernel.org')
+    summarizer = bugzillasummarizer
+
+    # Any Bugzilla instance, whatever its host name
+    def matches(self, url):
+        parsed = urlparse(str(url))
+        return (super().matches(url) or 'bugzilla' in (parsed.hostname or '')
+                or parsed.path.endswith('/show_bug.cgi'))
+
+    async def fetch(self, context, url):
+        pool = await context.page_pool()
+        async with context.host_limit(url):
+            content = await pool.scrape(url)
+        if content is None:
+            raise RuntimeError(bugzillascraper.scrape_errors.pop(url, "No content extracted"))
+        return content
+
+# debbugs pages are static: fetch them over HTTP and only render the ones lxml cannot parse
+class DebbugsAdapter(TrackerAdapter):
+    summarizer = gnusummarizer
+
+    # Stored under the tracker that serves the bug, even when --tracker forces one adapter for every link
+    def make_record(self, url, fields):
+        return make_record(debbugs_tracker(url), url, fields)
+
+    async def fetch(self, context, url):
+        async with context.host_limit(url):
+            try:
+                return await asyncio.to_thread(gnuscraper.fetch_gnu_record, context.http, url, stats=context.stats)
+            except Exception:
+                pool = await context.page_pool()
+                return await pool.run(url, lambda page: self.render(page, url, context.stats))
+
+    async def render(self, page, url, stats=None):
+        if stats is not None:
+            stats.begin(page, url)
+        try:
+            await goto_and_wait_async(page, url, WAIT_STRATEGIES['gnu'])
+            with metrics.span('extract', url):
+                return gnuscraper.extract_gnu_record_html(await page.content())
+        finally:
+            if stats is not None:
+                stats.end(page)
+
+@register
+class GnuAdapter(DebbugsAdapter):
+    name = 'gnu'
+    hosts = ('debbugs.gnu.org',)
+
+@register
+class DebianAdapter(DebbugsAdapter):
+    name = 'debian'
+    hosts = DEBIAN_HOSTS